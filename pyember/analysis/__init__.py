@@ -0,0 +1,3 @@
+from .observables import BlockingAccumulator, BinnedAccumulator, MMCObservables
+from .correlation import StructureFactor
+from .reweight import HistogramReweighting
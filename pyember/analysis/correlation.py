@@ -0,0 +1,128 @@
+import numpy as np
+
+class StructureFactor:
+    """
+    Class accumulating the static structure factor S(q) and the spin-spin
+    correlation function C(r) of a lattice spin configuration using FFT.
+
+    S(q) = |sum_r s_r exp(-iqr)|^2/N and C(r) = sum_r' <s_r'.s_r'+r>/N are
+    related by a Fourier transform, so both follow from a single FFT of the
+    lattice per measurement, O(N log N) instead of O(N^2) pair sums.
+    """
+
+    def __init__(self, dims, staggered=False):
+        """
+        Parameters
+        ----------
+        dims: tuple of int
+            lattice dimensions (Lx, Ly, Lz)
+        staggered: bool
+            multiply spins by (-1)^(x+y+z), which maps antiferromagnetic
+            order on the SC lattice to q = 0
+        """
+
+        self.dims = tuple(dims)
+        self.nsites = int(np.prod(self.dims))
+
+        self.sign = None
+        if staggered:
+            self.sign = (1 - 2*(np.indices(self.dims).sum(axis=0) % 2))[..., None]
+
+        # running sums of S(q) (half-space of real FFT) and magnetization
+        self.sq_sum = np.zeros(self.dims[:-1] + (self.dims[-1]//2 + 1,), dtype=np.float64)
+        self.mag_sum = 0.0
+        self.count = 0
+
+
+    def measure(self, latt):
+        """Adds S(q) of a configuration, latt shape(Lx, Ly, Lz, dim)"""
+
+        if self.sign is not None:
+            latt = latt*self.sign
+
+        sk = np.fft.rfftn(latt, axes=(0, 1, 2))
+        self.sq_sum += np.sum(sk.real**2 + sk.imag**2, axis=-1)/self.nsites
+        self.mag_sum = self.mag_sum + np.sum(latt.reshape(self.nsites, -1), axis=0)/self.nsites
+        self.count += 1
+
+
+    def get_structure_factor(self):
+        """Returns averaged S(q) on the full grid of wave vectors 2*pi*n/L, shape(Lx, Ly, Lz)"""
+
+        sq = self.sq_sum/max(self.count, 1)
+
+        # restore the other half-space, S(-q) = S(q)
+        full = np.empty(self.dims, dtype=np.float64)
+        nz = sq.shape[-1]
+        full[..., :nz] = sq
+        neg = (-np.arange(nz, self.dims[-1])) % self.dims[-1]
+        full[..., nz:] = np.roll(np.flip(sq, axis=(0, 1)), 1, axis=(0, 1))[..., neg]
+
+        return full
+
+
+    def get_correlation(self, connected=False):
+        """Returns averaged correlation function C(r), shape(Lx, Ly, Lz)
+
+        Parameters
+        ----------
+        connected: bool
+            subtract the squared mean magnetization per spin
+        """
+
+        sq = self.sq_sum/max(self.count, 1)
+        cr = np.fft.irfftn(sq, s=self.dims, axes=(0, 1, 2))
+
+        if connected and self.count > 0:
+            mag = self.mag_sum/self.count
+            cr -= np.sum(mag*mag)
+
+        return cr
+
+
+    def get_radial_correlation(self, connected=False):
+        """Returns C(r) averaged over shells of equal minimum-image distance
+
+        Returns
+        -------
+        r: np.array
+            distinct distances
+        cr: np.array
+            shell-averaged correlation function
+        """
+
+        cr = self.get_correlation(connected=connected)
+
+        # minimum image distances of lattice vectors
+        grids = np.meshgrid(*[np.minimum(np.arange(d), d - np.arange(d)) for d in self.dims], indexing='ij')
+        r2 = sum(g**2 for g in grids).ravel()
+
+        r2_shells, shell = np.unique(r2, return_inverse=True)
+        counts = np.bincount(shell)
+        cr_shells = np.bincount(shell, weights=cr.ravel())/counts
+
+        return np.sqrt(r2_shells), cr_shells
+
+
+    def get_correlation_length(self):
+        """Returns second-moment correlation length
+
+        xi = sqrt(S(0)/S(q_min) - 1)/(2 sin(q_min/2)), with S(q_min) averaged
+        over the smallest nonzero wave vectors along the lattice axes.
+        """
+
+        sq = self.sq_sum/max(self.count, 1)
+
+        sq_min = []
+        for axis, d in enumerate(self.dims):
+            index = [0, 0, 0]
+            index[axis] = 1
+            sq_min.append(sq[tuple(index)])
+
+        q_min = 2*np.pi/np.array(self.dims)
+        # perfectly ordered configurations give S(q_min) = 0 and xi = inf
+        with np.errstate(divide='ignore'):
+            ratio = sq[0, 0, 0]/np.array(sq_min) - 1.0
+        xi = np.sqrt(np.clip(ratio, 0.0, None))/(2*np.sin(q_min/2))
+
+        return np.mean(xi)
@@ -0,0 +1,249 @@
+import numpy as np
+
+class BlockingAccumulator:
+    """
+    Class accumulating a (vector) time series for mean values and
+    Flyvbjerg-Petersen blocking error analysis.
+
+    Level k holds statistics of averages of 2^k consecutive samples, so the
+    memory needed grows only with the number of levels, O(log n).
+    """
+
+    def __init__(self, dim=1, max_levels=48, min_blocks=16):
+        """
+        Parameters
+        ----------
+        dim: int
+            number of simultaneously accumulated observables
+        max_levels: int
+            maximum number of blocking levels
+        min_blocks: int
+            minimum number of blocks for a level to be used in error estimates
+        """
+
+        self.dim = dim
+        self.max_levels = max_levels
+        self.min_blocks = min_blocks
+
+        self.count = np.zeros(max_levels, dtype=np.int64)
+        self.sums = np.zeros((max_levels, dim), dtype=np.float64)
+        self.sumsq = np.zeros((max_levels, dim), dtype=np.float64)
+        self.pending = [None]*max_levels
+
+
+    def add(self, x):
+        """Adds a sample (scalar or shape(dim,))"""
+
+        x = np.array(x, dtype=np.float64).reshape(self.dim)
+
+        for k in range(self.max_levels):
+            self.count[k] += 1
+            self.sums[k] += x
+            self.sumsq[k] += x*x
+
+            # pair with the pending sample and pass the average a level up
+            if self.pending[k] is None:
+                self.pending[k] = x
+                break
+
+            x = 0.5*(self.pending[k] + x)
+            self.pending[k] = None
+
+
+    def get_mean(self):
+        """Returns mean values of the observables"""
+
+        return self.sums[0]/max(self.count[0], 1)
+
+
+    def get_level_errors(self):
+        """Returns standard errors of the mean estimated at each level with at least two blocks"""
+
+        levels = self.count > 1
+        n = self.count[levels, None]
+        var = self.sumsq[levels]/n - (self.sums[levels]/n)**2
+
+        return np.sqrt(np.clip(var, 0.0, None)/(n - 1))
+
+
+    def get_error(self):
+        """Returns blocking estimates of standard errors of the mean
+
+        The largest error of levels with at least min_blocks blocks
+        approximates the plateau reached for blocks longer than the
+        correlation time.
+        """
+
+        errors = self.get_level_errors()
+        if len(errors) == 0:
+            return np.full(self.dim, np.nan)
+
+        n_used = max(1, np.count_nonzero(self.count[:len(errors)] >= self.min_blocks))
+
+        return np.max(errors[:n_used], axis=0)
+
+
+    def get_tau(self):
+        """Returns integrated autocorrelation times (in units of samples)"""
+
+        errors = self.get_level_errors()
+        if len(errors) == 0:
+            return np.full(self.dim, np.nan)
+
+        ratio = np.divide(self.get_error(), errors[0], out=np.full(self.dim, np.nan), where=errors[0] > 0.0)
+
+        return 0.5*ratio**2
+
+
+class BinnedAccumulator:
+    """
+    Class accumulating a (vector) time series in a bounded number of bins.
+
+    When all bins are filled, neighboring bins are merged and the bin size
+    doubles, so memory stays constant. Bin averages serve jackknife error
+    estimates of nonlinear functions of mean values.
+    """
+
+    def __init__(self, dim=1, n_bins=64):
+
+        self.dim = dim
+        self.n_bins = n_bins
+        self.bin_size = 1
+
+        self.bins = np.zeros((2*n_bins, dim), dtype=np.float64)
+        self.n_full = 0
+        self.n_current = 0
+
+
+    def add(self, x):
+        """Adds a sample (scalar or shape(dim,))"""
+
+        self.bins[self.n_full] += np.asarray(x, dtype=np.float64).reshape(self.dim)
+        self.n_current += 1
+
+        if self.n_current == self.bin_size:
+            self.n_full += 1
+            self.n_current = 0
+
+            # merge neighboring bins when all are full
+            if self.n_full == 2*self.n_bins:
+                self.bins[:self.n_bins] = self.bins[0::2] + self.bins[1::2]
+                self.bins[self.n_bins:] = 0.0
+                self.n_full = self.n_bins
+                self.bin_size *= 2
+
+
+    def get_bin_means(self):
+        """Returns averages of full bins, shape(n_full, dim)"""
+
+        return self.bins[:self.n_full]/self.bin_size
+
+
+    def jackknife(self, func):
+        """Jackknife estimate of a function of mean values and its error
+
+        Parameters
+        ----------
+        func: callable
+            function of an array of mean values, shape(dim,), returning
+            a scalar or an array
+
+        Returns
+        -------
+        value, error: estimate and standard error
+        """
+
+        means = self.get_bin_means()
+        n = len(means)
+
+        if n < 2:
+            value = func(means.mean(axis=0)) if n == 1 else np.nan
+            return value, np.nan
+
+        # leave-one-bin-out averages
+        loo = (means.sum(axis=0) - means)/(n - 1)
+        values = np.array([func(m) for m in loo])
+        value_all = func(means.mean(axis=0))
+
+        value = n*value_all - (n - 1)*values.mean(axis=0)
+        error = np.sqrt((n - 1)*np.mean((values - values.mean(axis=0))**2, axis=0))
+
+        return value, error
+
+
+class MMCObservables:
+    """
+    Class for streaming measurements of thermodynamic observables of a spin system.
+
+    Accumulates E, E^2, |M|, M^2 and M^4 in constant memory, with blocking
+    error bars and integrated autocorrelation times, and derives specific
+    heat, susceptibility and Binder cumulant with jackknife errors.
+    """
+
+    names = ['E', 'E2', 'M', 'M2', 'M4']
+
+    def __init__(self, nsites, temp, n_bins=64):
+        """
+        Parameters
+        ----------
+        nsites: int
+            number of spins (used for per-spin specific heat and susceptibility)
+        temp: float
+            temperature
+        n_bins: int
+            number of bins for jackknife errors of derived quantities
+        """
+
+        self.nsites = nsites
+        self.temp = temp
+        self.beta = 1.0/temp
+
+        self.blocking = BlockingAccumulator(dim=len(self.names))
+        self.binning = BinnedAccumulator(dim=len(self.names), n_bins=n_bins)
+
+
+    def measure(self, energy, mag):
+        """Records a sample of total energy and magnetization magnitude |M|"""
+
+        m2 = mag*mag
+        x = np.array([energy, energy*energy, mag, m2, m2*m2])
+
+        self.blocking.add(x)
+        self.binning.add(x)
+
+
+    def _specific_heat(self, m):
+        return self.beta**2*(m[1] - m[0]**2)/self.nsites
+
+
+    def _susceptibility(self, m):
+        return self.beta*(m[3] - m[2]**2)/self.nsites
+
+
+    def _binder(self, m):
+        return 1.0 - m[4]/(3.0*m[3]**2)
+
+
+    def get_results(self):
+        """
+        Returns a dict of results: number of samples, mean values, errors and
+        autocorrelation times of the primary observables, and derived
+        quantities with errors.
+        """
+
+        results = {'samples': int(self.blocking.count[0]), 'temp': self.temp}
+
+        mean = self.blocking.get_mean()
+        error = self.blocking.get_error()
+        tau = self.blocking.get_tau()
+
+        for i, name in enumerate(self.names):
+            results[name] = mean[i]
+            results[name + '_err'] = error[i]
+            results[name + '_tau'] = tau[i]
+
+        derived = {'C': self._specific_heat, 'chi': self._susceptibility, 'U': self._binder}
+        for name, func in derived.items():
+            results[name], results[name + '_err'] = self.binning.jackknife(func)
+
+        return results
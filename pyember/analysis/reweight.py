@@ -0,0 +1,156 @@
+import numpy as np
+
+def logsumexp(a, axis=None):
+    """Returns log(sum(exp(a))) along axis, evaluated without overflow"""
+
+    a = np.asarray(a, dtype=np.float64)
+    amax = np.max(a, axis=axis, keepdims=True)
+    amax = np.where(np.isfinite(amax), amax, 0.0)
+
+    out = np.log(np.sum(np.exp(a - amax), axis=axis, keepdims=True)) + amax
+
+    if axis is None:
+        return out.item()
+
+    return np.squeeze(out, axis=axis)
+
+
+class HistogramReweighting:
+    """
+    Class for Ferrenberg-Swendsen reweighting of energy and magnetization
+    time series to other temperatures and external fields.
+
+    Samples of several runs at (T_k, H_k) are combined by multi-histogram
+    (WHAM) equations, solved self-consistently for the free energies f_k on
+    individual samples, i.e., without energy binning. A single run reduces
+    to single-histogram reweighting.
+
+    The energy of the Heisenberg model is E = E_J + H.M, so samples are
+    reweighted in the field through the total magnetization vector M.
+    """
+
+    def __init__(self, runs, nsites, tol=1e-10, max_iter=100000, chunk_size=2**22):
+        """
+        Parameters
+        ----------
+        runs: dict or list of dicts
+            time series of runs, with 'temp', 'H' (shape(3,)), 'energy'
+            (total energies, shape(n,)) and 'magnetization' (total
+            magnetization vectors, shape(n, 3)), e.g., MMCSim results['series']
+        nsites: int
+            number of spins (used for per-spin specific heat and susceptibility)
+        tol: float
+            convergence tolerance of free energies
+        max_iter: int
+            maximum number of self-consistent iterations
+        chunk_size: int
+            maximum number of (target, sample) pairs evaluated at once
+        """
+
+        runs = runs if isinstance(runs, list) else [runs]
+
+        self.nsites = nsites
+        self.chunk_size = chunk_size
+
+        self.betas = np.array([1.0/run['temp'] for run in runs])
+        self.fields = np.array([np.broadcast_to(np.asarray(run['H'], dtype=np.float64), 3) for run in runs])
+        self.n_samples = np.array([len(run['energy']) for run in runs])
+
+        # field-independent exchange energies and magnetization vectors of all samples
+        self.mag = np.concatenate([np.asarray(run['magnetization'], dtype=np.float64).reshape(-1, 3) for run in runs])
+        energy = np.concatenate([np.asarray(run['energy'], dtype=np.float64) for run in runs])
+        self.energy_J = energy - np.sum(np.repeat(self.fields, self.n_samples, axis=0)*self.mag, axis=1)
+
+        self.f = self._solve(tol, max_iter)
+
+        # log of the WHAM denominator, sum_k N_k exp(f_k - u_k), for each sample
+        self.log_den = logsumexp(self.f[:, None] - self._reduced_energy(self.betas, self.fields) + np.log(self.n_samples)[:, None], axis=0)
+
+
+    def _reduced_energy(self, betas, fields):
+        """Returns beta*E of all samples at given temperatures and fields, shape(K, n)"""
+
+        return betas[:, None]*(self.energy_J[None, :] + fields @ self.mag.T)
+
+
+    def _solve(self, tol, max_iter):
+        """Solves the WHAM equations for dimensionless free energies f_k = -ln Z_k"""
+
+        u = self._reduced_energy(self.betas, self.fields)
+        log_n = np.log(self.n_samples)[:, None]
+        f = np.zeros(len(self.betas))
+
+        for _ in range(max_iter):
+
+            log_den = logsumexp(f[:, None] - u + log_n, axis=0)
+            f_new = -logsumexp(-u - log_den[None, :], axis=1)
+            f_new -= f_new[0]
+
+            if np.max(np.abs(f_new - f)) < tol:
+                return f_new
+
+            f = f_new
+
+        raise RuntimeError(f'WHAM equations not converged in {max_iter} iterations')
+
+
+    def _log_weights(self, betas, fields):
+        """Returns unnormalized log weights of samples at target states, shape(K, n)"""
+
+        return -self._reduced_energy(betas, fields) - self.log_den[None, :]
+
+
+    def get_results(self, temps, fields=None):
+        """
+        Returns a dict of reweighted observables at target temperatures and
+        fields: mean values of E, E^2, |M|, M^2 and M^4, specific heat C,
+        susceptibility chi, Binder cumulant U, dimensionless free energy
+        f = -ln Z relative to the first run, and the effective number of
+        samples n_eff, each of shape(n_temps,).
+
+        Parameters
+        ----------
+        temps: float or array
+            target temperatures
+        fields: array, optional
+            target fields, shape(3,) or shape(n_temps, 3) (default field of the first run)
+        """
+
+        temps = np.atleast_1d(np.asarray(temps, dtype=np.float64))
+        betas = 1.0/temps
+
+        if fields is None:
+            fields = self.fields[0]
+        fields = np.array(np.broadcast_to(np.asarray(fields, dtype=np.float64), (len(temps), 3)))
+
+        m2 = np.sum(self.mag*self.mag, axis=1)
+        mabs = np.sqrt(m2)
+
+        names = ['E', 'E2', 'M', 'M2', 'M4']
+        results = {name: np.empty(len(temps)) for name in names + ['f', 'n_eff']}
+
+        # limit memory by evaluating targets in chunks
+        step = max(1, self.chunk_size//len(self.energy_J))
+        for start in range(0, len(temps), step):
+            k = slice(start, start + step)
+
+            log_w = self._log_weights(betas[k], fields[k])
+            log_z = logsumexp(log_w, axis=1)
+            w = np.exp(log_w - log_z[:, None])
+
+            energy = self.energy_J[None, :] + fields[k] @ self.mag.T
+            results['E'][k] = np.sum(w*energy, axis=1)
+            results['E2'][k] = np.sum(w*energy*energy, axis=1)
+            results['M'][k] = w @ mabs
+            results['M2'][k] = w @ m2
+            results['M4'][k] = w @ (m2*m2)
+            results['f'][k] = -log_z
+            results['n_eff'][k] = 1.0/np.sum(w*w, axis=1)
+
+        results['temp'] = temps
+        results['H'] = fields
+        results['C'] = betas**2*(results['E2'] - results['E']**2)/self.nsites
+        results['chi'] = betas*(results['M2'] - results['M']**2)/self.nsites
+        results['U'] = 1.0 - results['M4']/(3.0*results['M2']**2)
+
+        return results
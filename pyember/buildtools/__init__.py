@@ -1 +1 @@
-from .make_lattice import make_fcc, make_heisenberg
+from .make_lattice import make_fcc, make_heisenberg, make_ising
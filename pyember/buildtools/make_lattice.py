@@ -41,7 +41,9 @@ def make_fcc(box):
 
     return latt
 
-def make_heisenberg(dims=(8, 8, 8), pbc=(1, 1, 1), random=True):
+def make_heisenberg(dims=(8, 8, 8), pbc=(1, 1, 1), random=True, lattice='sc'):
+    """Creates a configuration of 3d spins on a lattice of dims primitive
+    cells of a SC, BCC or FCC lattice"""
 
     config = {}
     config['nat'] = np.prod(dims)
@@ -52,7 +54,8 @@ def make_heisenberg(dims=(8, 8, 8), pbc=(1, 1, 1), random=True):
     xyz = [(x, y, z) for x, y, z in product(range(dims[0]), range(dims[1]), range(dims[2]))]
     config['xyz'] = np.array(xyz)
 
-    config['latt_type'] = 'SC_n3'
+    config['latt_type'] = f'{lattice.upper()}_n3'
+    config['latt_i'] = np.arange(config['nat']).reshape(dims)
     config['latt_atoms'] = np.zeros(dims, dtype=int)
     config['latt_intra'] = np.zeros(tuple(dims) + (3,), dtype='float64')
 
@@ -73,6 +76,18 @@ def make_heisenberg(dims=(8, 8, 8), pbc=(1, 1, 1), random=True):
 
     return config
 
+def make_ising(dims=(8, 8, 8), pbc=(1, 1, 1), random=True):
+    """Creates a configuration of Ising spins (+1/-1) on the SC lattice"""
+
+    config = make_heisenberg(dims, pbc, random=False)
+    config['latt_type'] = 'SC_n1'
+    config['latt_intra'] = np.ones(tuple(dims) + (1,), dtype='float64')
+
+    if random:
+        config['latt_intra'][..., 0] = 2*np.random.randint(2, size=dims) - 1
+
+    return config
+
 
 if __name__ == "__main__":
 
@@ -1 +1,5 @@
 from .heisenberg import Heisenberg
+from .topology import LatticeTopology, neighbor_shells
+from .pair import PairHamiltonian
+from .dipolar import DipolarInteraction
+from .ising import Ising
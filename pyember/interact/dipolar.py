@@ -0,0 +1,139 @@
+import numpy as np
+from .topology import PRIMITIVE_VECTORS
+
+class DipolarInteraction:
+    """
+    Class for long-range dipole-dipole interactions of lattice spins
+
+    E_dip = 1/2 sum_i sum_j s_i.W(r_ij).s_j,  W(r) = D (I - 3 r r^T/r^2)/r^3
+
+    The periodic kernel W is summed over a cube of periodic images (i.e., a
+    cube-shaped sample of periodic cells) and stored with its FFT, so that
+    dipolar fields h_i = sum_j W(r_ij) s_j of the whole lattice are obtained
+    by FFT convolution in O(N log N) instead of O(N^2).
+
+    Single-spin changes are not propagated to all fields immediately. They
+    are kept in a pending batch, fields at proposed sites are corrected by
+    the pending changes, and all fields are recomputed by FFT when the
+    batch is full.
+    """
+
+    def __init__(self, dims, lattice='sc', strength=1.0, images=2, batch=None):
+        """
+        Parameters
+        ----------
+        dims: tuple of int
+            lattice dimensions in primitive cells (Lx, Ly, Lz)
+        lattice: str
+            'sc', 'bcc' or 'fcc' (positions r = n @ primitive vectors)
+        strength: float
+            dipolar coupling D (positive for magnetic dipoles)
+        images: int
+            periodic images -images..images along each axis in the kernel sum
+        batch: int, optional
+            number of pending spin changes before fields are recomputed
+            (default sqrt(N))
+        """
+
+        self.dims = tuple(int(d) for d in dims)
+        self.nsites = int(np.prod(self.dims))
+        self.vectors = PRIMITIVE_VECTORS[lattice.lower()]
+        self.strength = strength
+        self.images = images
+        self.batch = batch if batch is not None else max(1, int(np.sqrt(self.nsites)))
+
+        self.xyz = np.indices(self.dims).reshape(3, -1).T
+        self._setup_kernel()
+
+        self.field = None
+        self.pending_i = np.zeros(self.batch, dtype=np.int64)
+        self.pending_ds = np.zeros((self.batch, 3), dtype=np.float64)
+        self.n_pending = 0
+
+
+    def _setup_kernel(self):
+        """Sums dipolar tensors over periodic images for all lattice offsets"""
+
+        dims = np.array(self.dims)
+        kernel = np.zeros((self.nsites, 3, 3), dtype=np.float64)
+
+        # offsets centered around zero (minimum image)
+        offsets = (self.xyz + dims//2) % dims - dims//2
+
+        m = self.images
+        for img in np.indices((2*m + 1,)*3).reshape(3, -1).T - m:
+            r = (offsets + img*dims) @ self.vectors
+            r2 = np.sum(r*r, axis=1)
+            r2[r2 == 0.0] = np.inf
+
+            r3 = r2**1.5
+            kernel += np.eye(3)[None, :, :]/r3[:, None, None]
+            kernel -= 3.0*r[:, :, None]*r[:, None, :]/(r2*r3)[:, None, None]
+
+        # W(-r) = W(r) also for offsets of half the box length
+        opposite = np.ravel_multi_index(tuple(((-self.xyz) % dims).T), self.dims)
+        kernel = 0.5*(kernel + kernel[opposite])
+
+        self.kernel = self.strength*kernel
+        self.kernel_self = self.kernel[0]
+        self.kernel_k = np.fft.rfftn(self.kernel.reshape(self.dims + (3, 3)), axes=(0, 1, 2))
+
+
+    def get_field(self, latt):
+        """Returns dipolar fields h_i = sum_j W(r_ij) s_j, shape(Lx, Ly, Lz, 3)"""
+
+        latt_k = np.fft.rfftn(latt, axes=(0, 1, 2))
+        field_k = np.einsum('...ab,...b->...a', self.kernel_k, latt_k)
+
+        return np.fft.irfftn(field_k, s=self.dims, axes=(0, 1, 2))
+
+
+    def reset(self, latt):
+        """Recalculates dipolar fields of all spins and clears pending changes
+
+        Returns
+        -------
+        ui: np.array, shape(Lx, Ly, Lz)
+            dipolar site energies s_i.h_i/2
+        """
+
+        field = self.get_field(latt)
+        self.field = field.reshape(self.nsites, 3)
+        self.n_pending = 0
+
+        return 0.5*np.sum(latt*field, axis=-1)
+
+
+    def get_field_i(self, i):
+        """Returns current dipolar field at flat site i, including pending changes"""
+
+        field = self.field[i].copy()
+
+        n = self.n_pending
+        if n > 0:
+            offset = (self.xyz[i] - self.xyz[self.pending_i[:n]]) % self.dims
+            w = self.kernel[np.ravel_multi_index(tuple(offset.T), self.dims)]
+            field += np.einsum('nab,nb->a', w, self.pending_ds[:n])
+
+        return field
+
+
+    def get_energy_diff_i(self, i, ds):
+        """Returns dipolar energy change of spin i changed by ds
+
+        dE = ds.h_i + ds.W(0).ds/2, where W(0) couples the spin to its own
+        periodic images.
+        """
+
+        return ds.dot(self.get_field_i(i)) + 0.5*ds.dot(self.kernel_self.dot(ds))
+
+
+    def update(self, latt, i, ds):
+        """Records an accepted change ds of spin i (latt already updated)"""
+
+        self.pending_i[self.n_pending] = i
+        self.pending_ds[self.n_pending] = ds
+        self.n_pending += 1
+
+        if self.n_pending == self.batch:
+            self.reset(latt)
@@ -1,4 +1,5 @@
 import numpy as np
+from .topology import LatticeTopology
 
 class Heisenberg:
     """Class defining the Heisenberg Hamiltonian"""
@@ -14,6 +15,8 @@ class Heisenberg:
             spin-spin interaction parameter
         H: float
             spin-external field interaction parameter
+        local_field: bool, optional
+            keep local fields acting on each spin for fast energy differences
         """
 
         self.latt_type = 'SC_n3'
@@ -27,6 +30,22 @@ class Heisenberg:
         self.energy_total = 0.0
         self.boxvec = np.diag(config['box'])
         assert len(self.boxvec.shape) == 1, "Lattice box dimensions are not a vector"
+        self.topology = LatticeTopology(config['box'], config['pbc'], self.nbrlist)
+
+        # cached local fields h_i = J*sum_j s_j + H (flat site indices)
+        self.field = None
+        if params.get('local_field', False):
+            self.reset_local_field(config)
+
+        # no long-range terms
+        self.dipolar = None
+
+
+    def set_temperature(self, temp):
+        """Sets temperature (and inverse temperature) of the system"""
+
+        self.temp = temp
+        self.beta = 1.0/self.temp
 
 
     def _setup_neighbors(self):
@@ -46,6 +65,10 @@ class Heisenberg:
             raise ValueError(f'Chosen {self.latt_type} lattice. Currently only SC lattice is supported for Heisenberg model.')
 
         self.nbrlist = nbrlist
+
+        # one offset of each +/- pair, so that every bond is counted once
+        self.bondlist = [nbr for nbr in nbrlist if tuple(nbr) > tuple(-nbr)]
+
         self.ui = np.zeros(len(nbrlist) + 1, dtype=np.float64)
         self.dui = np.zeros(len(nbrlist) + 1, dtype=np.float64)
 
@@ -57,7 +80,7 @@ class Heisenberg:
         ----------
         config: Config object
         event: tuple
-            Event: initial to final state
+            Event: initial to final state of a site given by its flat index
 
         Returns
         -------
@@ -65,38 +88,34 @@ class Heisenberg:
             contribution of external and interspin interactions to energy
         """
 
-        ri = event[0][0]
-        ix, iy, iz = ri
-        sir = event[0][1]
+        i = event[0][0]
         skr = event[1][1]
 
-        sir = config['latt_intra'][ix, iy, iz, :]
+        latt = self.topology.flat(config['latt_intra'])
+        dsr = skr - latt[i]
 
-        self.dui[0] = self.H.dot(sir)
+        # with cached local fields only the total change is needed
+        if self.field is not None:
+            self.dui[0] = dsr.dot(self.field[i])
+            self.dui[1:] = 0.0
+            return self.beta*self.dui[0]
 
-        for j, nbr in enumerate(self.nbrlist, 1):
-            jx, jy, jz = (np.array(ri) + nbr) % self.boxvec
-            sjr = config['latt_intra'][jx, jy, jz, :]
+        self.dui[0] = self.H.dot(dsr)
+        self.dui[1:] = latt[self.topology.table[i]].dot(dsr)
+        self.dui[1:] *= self.J
 
-            self.dui[j]  = skr[0]*sjr[0] + skr[1]*sjr[1] + skr[2]*sjr[2]
-            self.dui[j] -= sir[0]*sjr[0] + sir[1]*sjr[1] + sir[2]*sjr[2]
-            self.dui[j] *= self.J
+        return self.beta*np.sum(self.dui)
 
-        return np.sum(self.beta*self.dui)
 
+    def get_energy_i(self, config, i):
+        """Returns interaction energy of atom at flat site index i"""
 
-    def get_energy_i(self, config, ri):
-        """Returns interaction energy of atom i"""
-
-        ix, iy, iz = ri
-        sir = config['latt_intra'][ix, iy, iz, :]
+        latt = self.topology.flat(config['latt_intra'])
+        sir = latt[i]
 
         self.ui[0] = self.H.dot(sir)
-
-        for j, nbr in enumerate(self.nbrlist, 1):
-            jx, jy, jz = (np.array(ri) + nbr) % self.boxvec
-            sjr = config['latt_intra'][jx, jy, jz, :]
-            self.ui[j] = self.J*sir.dot(sjr)
+        self.ui[1:] = latt[self.topology.table[i]].dot(sir)
+        self.ui[1:] *= self.J
 
         return self.ui
 
@@ -104,14 +123,117 @@ class Heisenberg:
     def get_energy_total(self, config):
         """Returns interaction energy of the whole lattice system"""
 
-        u_tot = 0.0
-        for ri in config['xyz']:
-            ui = self.get_energy_i(config, ri)
-            u_tot += 2*ui[0]
-            u_tot += np.sum(ui[1:])
+        energy_total, _, _ = self.get_energy_bulk(config)
+
+        return energy_total
+
+
+    def get_energy_bulk(self, config):
+        """Evaluates energies and magnetization of the whole lattice at once
+
+        Bond energies are calculated as dot products of the lattice with its
+        shifted copies, one shift per bond direction.
+
+        Parameters
+        ----------
+        config: Config object
+
+        Returns
+        -------
+        energy_total: float
+            interaction energy of the whole lattice system
+        energy_i: np.array, shape(nat,)
+            interaction energies of individual atoms
+        magnetization: tuple
+            |M| and its components (see get_magnetization)
+        """
+
+        latt = config['latt_intra']
+
+        # external field contribution
+        ui = latt.dot(self.H)
+
+        # split bond energies between the two participating sites
+        for nbr in self.bondlist:
+            bond = 0.5*self.J*np.sum(latt*np.roll(latt, tuple(-nbr), axis=(0, 1, 2)), axis=-1)
+            ui += bond
+            ui += np.roll(bond, tuple(nbr), axis=(0, 1, 2))
+
+        self.energy_i[config['latt_i']] = ui
+        self.energy_total = np.sum(ui)
+
+        # refresh cached local fields (also removes accumulated round-off)
+        if self.field is not None:
+            self.reset_local_field(config)
+
+        return self.energy_total, self.energy_i, self.get_magnetization(config)
+
+
+    def get_neighbor_sum(self, latt):
+        """Returns sum of neighbor spins for every site of the lattice
+
+        Parameters
+        ----------
+        latt: np.array, shape(Lx, Ly, Lz, 3)
+            spin orientations on the lattice (e.g., config['latt_intra'])
+
+        Returns
+        -------
+        nsum: np.array, shape(Lx, Ly, Lz, 3)
+            sum of spins over the neighbors of each site
+        """
+
+        nsum = np.zeros_like(latt)
+        for nbr in self.nbrlist:
+            nsum += np.roll(latt, tuple(-nbr), axis=(0, 1, 2))
+
+        return nsum
+
+
+    def get_local_field(self, config):
+        """Returns local field h_i = J*sum_j s_j + H acting on every spin"""
+
+        field = self.J*self.get_neighbor_sum(config['latt_intra'])
+        field += self.H
+
+        return field
+
+
+    def reset_local_field(self, config):
+        """Recalculates cached local fields of all spins"""
+
+        self.field = self.topology.flat(self.get_local_field(config))
+
+
+    def get_energy_diff_sublattice(self, config, mask, new_spins, field=None):
+        """Returns interaction energy differences for a set of non-interacting sites
+
+        Sites selected by mask must not be neighbors of each other (e.g.,
+        one parity sublattice of the SC lattice), so that the energy
+        differences are independent.
+
+        Parameters
+        ----------
+        config: Config object
+        mask: np.array of bool, shape(Lx, Ly, Lz)
+            sites with proposed new spin orientations
+        new_spins: np.array, shape(n, 3)
+            proposed spin orientations of the masked sites
+        field: np.array, shape(Lx, Ly, Lz, 3), optional
+            precomputed local field (see get_local_field)
+
+        Returns
+        -------
+        du: np.array, shape(n,)
+            energy differences of the proposed changes
+        """
+
+        if field is None:
+            field = self.get_local_field(config)
+
+        ds = new_spins - config['latt_intra'][mask]
 
-        self.energy_total = 0.5*u_tot
-        return self.energy_total
+        return np.einsum('ij,ij->i', ds, field[mask])
 
 
     def _check_consistency(self, config):
@@ -124,9 +246,7 @@ class Heisenberg:
         
     def get_magnetization(self, config):
 
-        sum_sx = np.sum(config['latt_intra'][:,:,:,0])
-        sum_sy = np.sum(config['latt_intra'][:,:,:,1])
-        sum_sz = np.sum(config['latt_intra'][:,:,:,2])
+        sum_sx, sum_sy, sum_sz = np.sum(config['latt_intra'].reshape(-1, 3), axis=0)
 
         mag = np.sqrt(sum_sx**2 + sum_sy**2 + sum_sz**2)
 
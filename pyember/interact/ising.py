@@ -0,0 +1,175 @@
+import numpy as np
+from .topology import LatticeTopology
+
+class Ising:
+    """Class defining the Ising Hamiltonian
+
+    E = H sum_i s_i + J/2 sum_i sum_j s_i s_j, s_i = +1 or -1,
+
+    stored as a single internal coordinate, config['latt_intra'][..., 0].
+    Energy changes of spin flips take only a few values, which are declared
+    in energy_levels for tabulated acceptance probabilities.
+    """
+
+    def __init__(self, config, params):
+        """Initializes Ising Hamiltonian
+
+        Parameters
+        ----------
+        config: Config object
+            lattice type SC_n1
+        params: dict
+            'Temp', spin-spin interaction 'J' and external field 'H' (scalars)
+        """
+
+        self.latt_type = 'SC_n1'
+        self._check_consistency(config)
+        self.temp = params['Temp']
+        self.beta = 1.0/self.temp
+        self.J = float(params['J'])
+        self.H = float(params['H'])
+        self._setup_neighbors()
+        self.energy_i = np.zeros(config['atom_types'].shape, dtype=np.float64)
+        self.energy_total = 0.0
+        self.boxvec = np.diag(config['box'])
+        self.topology = LatticeTopology(config['box'], config['pbc'], self.nbrlist)
+
+        # no cached local fields or long-range terms
+        self.field = None
+        self.dipolar = None
+
+        # spin flip energy changes dE = -2 s (J*nsum + H) for s = -1, 1 and
+        # neighbor sums nsum = -z, -z+2, ..., z (index set by get_energy_diff_i)
+        z = len(self.nbrlist)
+        s = np.repeat([-1.0, 1.0], z + 1)
+        nsum = np.tile(np.arange(-z, z + 1, 2), 2)
+        self.energy_levels = -2.0*s*(self.J*nsum + self.H)
+        self.level = 0
+
+
+    def set_temperature(self, temp):
+        """Sets temperature (and inverse temperature) of the system"""
+
+        self.temp = temp
+        self.beta = 1.0/self.temp
+
+
+    def _setup_neighbors(self):
+        """Creates lists of neighboring sites"""
+
+        nbrlist = []
+
+        # NN
+        nbrlist.append(np.array([ 1, 0, 0]))
+        nbrlist.append(np.array([-1, 0, 0]))
+        nbrlist.append(np.array([ 0, 1, 0]))
+        nbrlist.append(np.array([ 0,-1, 0]))
+        nbrlist.append(np.array([ 0, 0, 1]))
+        nbrlist.append(np.array([ 0, 0,-1]))
+
+        self.nbrlist = nbrlist
+
+        # one offset of each +/- pair, so that every bond is counted once
+        self.bondlist = [nbr for nbr in nbrlist if tuple(nbr) > tuple(-nbr)]
+
+        self.ui = np.zeros(len(nbrlist) + 1, dtype=np.float64)
+        self.dui = np.zeros(len(nbrlist) + 1, dtype=np.float64)
+
+
+    def get_energy_diff_i(self, config, event):
+        """Returns energy difference of a spin flip at flat site index i
+
+        Parameters
+        ----------
+        config: Config object
+        event: tuple
+            Event: initial to final state of a site given by its flat index
+
+        Returns
+        -------
+        beta*du: float
+            energy difference scaled by inverse temperature; contributions
+            are kept in self.dui and the index of the energy change in
+            energy_levels in self.level
+        """
+
+        i = event[0][0]
+
+        latt = self.topology.flat(config['latt_intra'])[:, 0]
+        si = latt[i]
+        sj = latt[self.topology.table[i]]
+        ds = event[1][1][0] - si
+
+        self.dui[0] = self.H*ds
+        self.dui[1:] = self.J*ds*sj
+
+        z = len(sj)
+        self.level = int(si > 0)*(z + 1) + int(np.sum(sj) + z)//2
+
+        return self.beta*np.sum(self.dui)
+
+
+    def get_energy_i(self, config, i):
+        """Returns interaction energy of atom at flat site index i"""
+
+        latt = self.topology.flat(config['latt_intra'])[:, 0]
+
+        self.ui[0] = self.H*latt[i]
+        self.ui[1:] = self.J*latt[i]*latt[self.topology.table[i]]
+
+        return self.ui
+
+
+    def get_energy_total(self, config):
+        """Returns interaction energy of the whole lattice system"""
+
+        energy_total, _, _ = self.get_energy_bulk(config)
+
+        return energy_total
+
+
+    def get_energy_bulk(self, config):
+        """Evaluates energies and magnetization of the whole lattice at once
+
+        Returns
+        -------
+        energy_total: float
+            interaction energy of the whole lattice system
+        energy_i: np.array, shape(nat,)
+            interaction energies of individual atoms
+        magnetization: tuple
+            |M| and its components (see get_magnetization)
+        """
+
+        latt = config['latt_intra'][..., 0]
+
+        # external field contribution
+        ui = self.H*latt
+
+        # split bond energies between the two participating sites
+        for nbr in self.bondlist:
+            bond = 0.5*self.J*latt*np.roll(latt, tuple(-nbr), axis=(0, 1, 2))
+            ui += bond
+            ui += np.roll(bond, tuple(nbr), axis=(0, 1, 2))
+
+        self.energy_i[config['latt_i']] = ui
+        self.energy_total = np.sum(ui)
+
+        return self.energy_total, self.energy_i, self.get_magnetization(config)
+
+
+    def _check_consistency(self, config):
+        """Checks if the configuration has a single internal spin coordinate"""
+
+        assert config['latt_type'] == self.latt_type, f"Incompatible lattice {config['latt_type']} vs {self.latt_type}"
+
+        if 'latt_intra' not in config.keys():
+            raise KeyError('latt_intra key not in configuration for Ising model')
+
+
+    def get_magnetization(self, config):
+        """Returns |M| and magnetization components (M, 0, 0)"""
+
+        mag = np.sum(config['latt_intra'][..., 0])
+
+        return abs(mag), mag, 0.0, 0.0
@@ -14,46 +14,68 @@ import numpy as np
 from itertools import product
 from collections import Counter, defaultdict
 #import events
-from .events import EventTree
+from ..move.events import EventTree, EventStore, WeightedEventStore, encode_event, decode_event, NO_DIRECTION
+from ..move.rng import RandomStream
+from .topology import LatticeTopology, neighbor_shells
 
 class KMCModel:
     """Class managing kmc moves and event modifications"""
 
-    def __init__(self, latt_type):
+    def __init__(self, latt_type, rng=None):
         self.latt_type = latt_type
+        self.rng = rng if rng is not None else RandomStream()
+        self.barriers = None
+        self.etree = None
         self.__setup_neighbors()
+        self.__setup_tables()
 
     def __setup_neighbors(self):
         """Create lists of neighboring (nn & nnn) sites"""
 
-        nbrlist = []
-
         if self.latt_type == 'fcc':
-            # NN
-            nbrlist.append(np.array([ 1, 1, 0]))
-            nbrlist.append(np.array([ 1,-1, 0]))
-            nbrlist.append(np.array([-1, 1, 0]))
-            nbrlist.append(np.array([-1,-1, 0]))
-            nbrlist.append(np.array([ 1, 0,-1]))
-            nbrlist.append(np.array([-1, 0,-1]))
-            nbrlist.append(np.array([ 0, 1,-1]))
-            nbrlist.append(np.array([ 0,-1,-1]))
-            nbrlist.append(np.array([ 1, 0, 1]))
-            nbrlist.append(np.array([-1, 0, 1]))
-            nbrlist.append(np.array([ 0, 1, 1]))
-            nbrlist.append(np.array([ 0,-1, 1]))
-            # NNN
-            nbrlist.append(np.array([ 2, 0, 0]))
-            nbrlist.append(np.array([-2, 0, 0]))
-            nbrlist.append(np.array([ 0, 2, 0]))
-            nbrlist.append(np.array([ 0,-2, 0]))
-            nbrlist.append(np.array([ 0, 0, 2]))
-            nbrlist.append(np.array([ 0, 0,-2]))
+            # NN (12) and NNN (6) on the cubic grid of FCC sites
+            nbrlist = [nbr for shell in neighbor_shells('fcc', 2, grid='cubic') for nbr in shell]
         else:
             raise ValueError(f'Chosen {self.latt_type} lattice. Currently only FCC lattice is supported.')
 
         self.nbrlist = nbrlist
 
+        # index of the opposite offset (direction from the neighbor back to the site)
+        nbr = np.array(nbrlist)
+        self.opposite = [int(np.flatnonzero((nbr == -dr).all(axis=1))[0]) for dr in nbr]
+
+
+    def __setup_tables(self):
+        """
+        Create lookup tables indexed by neighbor occupancy bitmasks
+
+        Bit d of a site's bitmask is set if its neighbor in direction d
+        (index into nbrlist) is occupied; bits 0-11 are nearest neighbors
+        and bits 12-17 next nearest neighbors.
+        """
+
+        self.nn_mask = (1 << 12) - 1
+
+        # number of occupied nearest neighbors
+        self.nn_count = [bin(m).count('1') for m in range(1 << 12)]
+
+        # vacant nearest neighbor directions available for diffusion (not upward)
+        down = [d for d in range(12) if self.nbrlist[d][2] <= 0]
+        self.vacant_dirs = [tuple(d for d in down if not (m >> d) & 1) for m in range(1 << 12)]
+
+
+    def _set_occupancy(self, i, occupied):
+        """
+        Updates bitmasks of the neighbors of flat site i after its occupancy changed
+        """
+
+        neighbors = self.nbr_table[i]
+
+        if occupied:
+            np.bitwise_or.at(self.occupancy, neighbors, self.opposite_bits)
+        else:
+            np.bitwise_and.at(self.occupancy, neighbors, ~self.opposite_bits)
+
 
     def make_lattice(self, xyz, box):
         """
@@ -78,27 +100,39 @@ class KMCModel:
         self.xyz = xyz
         self.nat = len(self.xyz)
 
+        # flat view of the lattice and neighbor table over flat site indices
+        self.topology = LatticeTopology(box, (1, 1, 1), self.nbrlist)
+        self.latt_flat = self.topology.flat(self.latt)
+        self.nbr_table = self.topology.table.astype(np.int64)
+
+        # neighbor occupancy bitmasks of all sites (see __setup_tables)
+        bits = np.left_shift(1, np.arange(len(self.nbrlist)), dtype=np.int64)
+        self.occupancy = (self.latt_flat > 0)[self.nbr_table].astype(np.int64) @ bits
+        self.opposite_bits = bits[self.opposite]
+
         # Set grain number of each substrate atom to 0
         self.grain = [0 for _ in range(self.nat)]
 
 
-    def find_neighbors(self, ri):
+    def find_neighbors(self, i):
+        """
+        Find nearest neighbors of flat site i and grain numbers of the
+        atoms occupying them
+        """
+
+        neighbors = self.nbr_table[i, :12]
+        grain_numbers = [self.grain[iatom-1] for iatom in self.latt_flat[neighbors] if iatom > 0]
+
+        return neighbors.tolist(), grain_numbers
+
+
+    def count_neighbors(self, i):
         """
-        FInd neighbors and return ids usable in site_dict
+        Returns the number of atoms on nearest neighbor sites of flat site i
         """
 
-        # search nearest neighbors
-        # to determine stable sites (needs at least 3)
-        neighbors = []
-        grain_numbers = []
-        for dr in self.nbrlist[0:12]:
-            rj = tuple((np.array(ri) + dr) % self.box)
-            iatom = self.latt[rj]
-            neighbors.append(rj)
-            if iatom > 0:
-                grain_numbers.append(self.grain[iatom-1])
+        return self.nn_count[int(self.occupancy[i]) & self.nn_mask]
 
-        return neighbors, grain_numbers
 
     def get_grain(self, grain_numbers):
 
@@ -114,64 +148,163 @@ class KMCModel:
 
         return g_number
 
-    def find_events(self, rj):
+
+    def get_target(self, event):
+        """
+        Returns source and target flat site indices of an encoded event
         """
-        Finds events for site j at rj.
+
+        _, i, direction = decode_event(event)
+
+        if direction == NO_DIRECTION:
+            return i, i
+
+        return i, int(self.nbr_table[i, direction])
+
+
+    def find_events(self, j):
+        """
+        Finds events for flat site j.
         Should be used in init_events
         """
 
-        ix, iy, iz = rj
-        iatom = self.latt[ix, iy, iz]
-        #print('rj', type(rj), rj, iatom)
+        iatom = self.latt_flat[j]
 
         events_found = []
 
         # vacancy, test for possibility of deposition event
         if iatom == 0:
-           # rj = np.array(rj, dtype=int)
-
-            # count number of atomic neighbors in the target position
-            _, grain_numbers_j = self.find_neighbors(rj)
 
             # if 3 or more nearest neighbors with grain IDs, create a deposition event
-            if len(grain_numbers_j) > 2:
-                events_found.append((0, ix, iy, iz, ix, iy, iz))
+            if self.count_neighbors(j) > 2:
+                events_found.append(encode_event(0, j, NO_DIRECTION))
 
         # atom, find diffusion events
         elif iatom > 0:
 
-            # search for possible diffusion events
+            # search for possible diffusion events to vacant nearest neighbor
+            # sites, which are not above the atom (do not diffuse upward)
+            for direction in self.vacant_dirs[int(self.occupancy[j]) & self.nn_mask]:
+                k = self.nbr_table[j, direction]
 
-            # explore neighborhood of atom j
-            neighbors_j, grain_numbers_j = self.find_neighbors(rj)
+                # if number of real atoms 3 or more, make vacancy available as
+                # a destination for deposition and diffusion
+                if self.count_neighbors(k) - 1 > 2:
+                    events_found.append(encode_event(1, j, direction))
 
-            for rk in neighbors_j:
+        return events_found
 
-                # find if vacancy is a good destination spot
-                if self.latt[rk] == 0:
-                    _, grain_numbers_k = self.find_neighbors(rk)
 
-                    # if number of real atoms 3 or more, make vacancy available as
-                    # a destination for deposition and diffusion
-                    if len(grain_numbers_k)-1 > 2:
-                        # do not diffuse upward
-                        if rk[2] > rj[2]:
-                            continue
-                        events_found.append((1, ix, iy, iz, rk[0], rk[1], rk[2]))
+    def get_rate(self, event):
+        """
+        Returns the Arrhenius rate of an encoded event
 
-        return events_found
+        Deposition proceeds with a constant rate per available site, the
+        diffusion barrier grows with the number of atoms in the nearest
+        (and next nearest) neighbor shell of the diffusing atom:
+        rate = prefactor*exp(-(diffusion + bond*n_nn + bond_nnn*n_nnn)/kT),
+        tabulated for all neighbor occupancy bitmasks of the atom.
+        """
 
+        event_type, i, _ = decode_event(event)
+
+        if event_type == 0:
+            return self.barriers['deposition']
+
+        return self.rate_table[self.occupancy[i]]
+
+
+    def _setup_rate_table(self):
+        """
+        Tabulates diffusion rates for all neighbor occupancy bitmasks
+        """
+
+        masks = np.arange(1 << len(self.nbrlist))
+
+        n_nn = np.zeros(masks.shape, dtype=int)
+        n_nnn = np.zeros(masks.shape, dtype=int)
+        for d in range(len(self.nbrlist)):
+            if d < 12:
+                n_nn += (masks >> d) & 1
+            else:
+                n_nnn += (masks >> d) & 1
+
+        barrier = self.barriers['diffusion'] + self.barriers['bond']*n_nn + self.barriers.get('bond_nnn', 0.0)*n_nnn
+
+        self.rate_table = self.barriers['prefactor']*np.exp(-barrier/self.barriers['kT'])
 
-    def init_events(self, rates):
- 
-        rates = np.array(rates)
 
-        # structure to store event information list of sets, containing
-        # events dictionary keys
-        event_list = [set() for _ in range(rates.shape[0])]
+    def _update_rates(self, sites):
+        """
+        Recalculates rates of existing events of the given sites
+        """
+
+        for i in sites:
+            for event in self.site_dict.get(i, []):
+                event_type, _, _ = decode_event(event)
+                self.event_list[event_type].set_rate(event, self.get_rate(event))
+
+
+    def _add_event(self, event):
+        """
+        Stores an encoded event and registers it with its source site
+        """
+
+        event_type, i, _ = decode_event(event)
+
+        if self.barriers is None:
+            self.event_list[event_type].add(event)
+        else:
+            self.event_list[event_type].add(event, self.get_rate(event))
+
+        self.site_dict[i].append(event)
+
+
+    def _remove_event(self, event):
+        """
+        Removes an event (site_dict entries are cleared by the caller)
+        """
+
+        event_type, _, _ = decode_event(event)
+
+        self.event_list[event_type].remove(event)
+
+
+    def init_events(self, rates=None, barriers=None):
+        """
+        Finds all deposition and diffusion events of the initial configuration
+
+        Parameters
+        ----------
+        rates: list of float
+            rates of event types (deposition, diffusion), shared by all events
+            of a type
+        barriers: dict, optional
+            parameters of site-resolved Arrhenius rates (see get_rate):
+            'prefactor', 'kT', 'deposition' (rate per site), 'diffusion'
+            (barrier of an isolated atom), 'bond' and optionally 'bond_nnn'
+            (barrier increase per nearest and next nearest neighbor atom).
+            If given, each event carries its own rate and rates is ignored.
+        """
+
+        if barriers is None and rates is None:
+            raise ValueError('Either event type rates or barriers are needed')
+
+        self.barriers = barriers
+
+        if self.barriers is not None:
+            self._setup_rate_table()
+
+        # structure to store event information: list of event stores (one
+        # per event type) containing encoded events
+        if self.barriers is None:
+            rates = np.array(rates)
+            self.event_list = [EventStore() for _ in range(rates.shape[0])]
+        else:
+            self.event_list = [WeightedEventStore() for _ in range(2)]
 
-        # dictionary to store references to event_list
-        site_dict = defaultdict(list)
+        # dictionary to store events belonging to a flat site index
+        self.site_dict = defaultdict(list)
 
         # Deposition event - find vacant sites available for deposition
         for ix, iy in product(range(self.box[0]), range(self.box[1])):
@@ -179,55 +312,41 @@ class KMCModel:
             # find z position
             for iz in range(self.box[2]):
                 if self.latt[ix, iy, iz] == 0:
-                    t_ri = (ix, iy, iz)
+                    i = self.topology.flat_index((ix, iy, iz))
  
-                    # count number of neighbors in the target position
-                    neighbors, grain_numbers = self.find_neighbors(t_ri)
-
                     # if 3 or more nearest neighbors with grain IDs, create a deposition event
-                    if len(grain_numbers) > 2:
-                        event_tuple = (0, ix, iy, iz, ix, iy, iz)
-                        event_list[0].add(event_tuple)
-
-                        # add event information to the site
-                        site_dict[t_ri].append(event_tuple)
+                    if self.count_neighbors(i) > 2:
+                        self._add_event(encode_event(0, i, NO_DIRECTION))
                     break
 
         # diffusion events for actual atoms (i.e., atom id > 0)
-        for i, ri in enumerate(self.xyz, start=1):
+        for ri in self.xyz:
             if ri[2] < 2: continue
 
+            i = self.topology.flat_index(ri)
+
             # cycle over neighbor sites
-            for dr in self.nbrlist:
+            for direction, dr in enumerate(self.nbrlist):
 
                 # do not diffuse upward
                 if dr[2] > 0: continue
 
-                rj = tuple((ri + dr) % self.box)
+                j = int(self.nbr_table[i, direction])
 
                 # is vacancy in the neighborhood of atom i?
-                if self.latt[rj] == 0:
-
-                    # explore neighborhood of the target vacancy
-                    neighbors, grain_numbers = self.find_neighbors(rj)
-
-                    # if 3 or more nearest neighbors with grain IDs present, create a diffusion event
-                    if len(grain_numbers) > 2:
-                        event_tuple = (1, ri[0], ri[1], ri[2], rj[0], rj[1], rj[2])
-                        event_list[1].add(event_tuple)
-                        # add event information to the site
-                        site_dict[tuple(ri)].append(event_tuple)
-
-        self.event_list =  event_list
-        self.site_dict = site_dict
+                # if 3 or more nearest neighbors with grain IDs present, create a diffusion event
+                if self.latt_flat[j] == 0 and self.count_neighbors(j) > 2:
+                    self._add_event(encode_event(1, i, direction))
 
         # Get dictionary of event type counts
         n_events = np.array([len(e) for e in self.event_list])
         print('Number of events:', n_events)
 
-        # Initiate event data structures
-        self.etree = EventTree(rates)
-        self.etree.update_events(n_events)
+        # Initiate event data structures (events with individual rates are
+        # selected directly from the weighted stores)
+        if self.barriers is None:
+            self.etree = EventTree(rates, rng=self.rng)
+            self.etree.update_events(n_events)
 
 
     def move(self, event_type, event_number):
@@ -241,110 +360,106 @@ class KMCModel:
         if len(self.xyz) == self.box[0]*self.box[1]*self.box[2]/2:
             raise ValueError(f'Lattice is full of atoms, no more events possible.')
 
-        # find a tuple containing information about the selected event
-        event = tuple(self.event_list[event_type])[event_number]
+        # find the selected event and its source and target sites
+        event = self.event_list[event_type][event_number]
+        i0, i1 = self.get_target(event)
         old_events = []
         new_events = []
-        n_events = self.etree.n_events
 
-        print('# event:', event, 'ev#', [len(el) for el in self.event_list], end='')
+        print('# event:', decode_event(event), 'ev#', [len(el) for el in self.event_list], end='')
         print('at#',len(self.xyz), 'gr#', len(set(self.grain)), 'lxyz', self.xyz[-1])
 
-        for i in range(len(self.event_list)):
-            assert len(self.event_list[i]) == n_events[i], f'Start: Number of events of type {i} does not match: {len(self.event_list[i])} vs. {n_events[i]}' 
+        if self.etree is not None:
+            n_events = self.etree.n_events
+            for i in range(len(self.event_list)):
+                assert len(self.event_list[i]) == n_events[i], f'Start: Number of events of type {i} does not match: {len(self.event_list[i])} vs. {n_events[i]}' 
 
         # deposition event
         if event_type == 0:
-            t_ri = event[4:7]
-            ri = np.array(t_ri)
+            ri = np.array(np.unravel_index(i1, self.box))
 
             # create a new atom
             self.xyz.append(ri) 
             iatom = len(self.xyz)
 
             # put it on a lattice
-            self.latt[t_ri] = iatom # id for the site properties with atom id and list of events
+            self.latt_flat[i1] = iatom # id for the site properties with atom id and list of events
+            self._set_occupancy(i1, True)
 
             # search neighbors and grain numbers
-            neighbors, grain_numbers = self.find_neighbors(t_ri)
+            neighbors, grain_numbers = self.find_neighbors(i1)
 
             # assign a new grain number to the atom
             self.grain.append(self.get_grain(grain_numbers))
 
             # Identify old events for removal
             # remove the current deposition event
-            old_events.extend(self.site_dict[t_ri])
             # ... and the associated dictionary of site events
-            del self.site_dict[t_ri]
+            old_events.extend(self.site_dict.pop(i1, []))
 
             # find diffusion events of the deposited atom
-            events_found = self.find_events(t_ri)
+            events_found = self.find_events(i1)
             new_events.extend(events_found)
 
             # remove all old events of the new neighbors and add their new events
-            for t_rj in neighbors:
+            for j in neighbors:
 
-                if t_rj == t_ri:
+                if j == i1:
                     continue
 
                 # remove all current events of neighbor j
-                old_events.extend(self.site_dict[t_rj])
-                del self.site_dict[t_rj]
+                old_events.extend(self.site_dict.pop(j, []))
 
                 # add new events of neighbor j
-                events_found = self.find_events(t_rj)
+                events_found = self.find_events(j)
                 new_events.extend(events_found)
 
 
         elif event_type == 1: # diffusion
-            t_r0 = event[1:4] # initial position
-            t_ri = event[4:7] # final position
-            r0 = np.array(t_r0)
-            ri = np.array(t_ri)
+            ri = np.array(np.unravel_index(i1, self.box))
 
             # identify atom (to access associated events)
-            iatom = self.latt[t_r0]
+            iatom = self.latt_flat[i0]
 
             # remove all current events of atom iatom
-            old_events.extend(self.site_dict[t_r0])
-            del self.site_dict[t_r0]
+            old_events.extend(self.site_dict.pop(i0, []))
 
             # remove all current events of the destination vacancy
-            old_events.extend(self.site_dict[t_ri])
-            del self.site_dict[t_ri]
+            old_events.extend(self.site_dict.pop(i1, []))
 
             # search neighbors of the initial state
-            neighbors_old, _ = self.find_neighbors(t_r0)
+            neighbors_old, _ = self.find_neighbors(i0)
 
             # move atom to the new position
-            self.latt[t_r0] = 0
-            self.latt[t_ri] = iatom
+            self.latt_flat[i0] = 0
+            self.latt_flat[i1] = iatom
+            self._set_occupancy(i0, False)
+            self._set_occupancy(i1, True)
             self.xyz[iatom-1] = ri
 
             # find events of the moved atom
-            events_found = self.find_events(ri)
+            events_found = self.find_events(i1)
 
             # update site dict and new_events list cycle through new events
             new_events.extend(events_found)
 
             # search neighbors and grain numbers for final state 
-            neighbors_new, grain_numbers = self.find_neighbors(t_ri)
+            neighbors_new, grain_numbers = self.find_neighbors(i1)
 
             # assign a new grain number to the atom
             self.grain[iatom-1] = self.get_grain(grain_numbers)
 
             # remove all old events of the old and new neighbors
             # and add new events
-            for t_rj in set(neighbors_old + neighbors_new):
+            for j in set(neighbors_old + neighbors_new):
 
-                if t_rj == t_ri or t_rj == t_r0:
+                if j == i1 or j == i0:
                     continue
 
-                old_events.extend(self.site_dict[t_rj])
-                del self.site_dict[t_rj]
+                old_events.extend(self.site_dict.pop(j, []))
 
                 # add new events of neighbor j
-                events_found = self.find_events(t_rj)
+                events_found = self.find_events(j)
                 new_events.extend(events_found)
 
 
@@ -353,14 +468,11 @@ class KMCModel:
         for i in range(len(self.event_list)):
             o_events += len(self.event_list[i])
 
-        for ev in old_events:
-            self.event_list[ev[0]].remove(ev)
+        for event in old_events:
+            self._remove_event(event)
 
-        for ev in new_events:
-            if ev in self.event_list[ev[0]]:
-                print('present', ev)
-            self.event_list[ev[0]].add(ev)
-            self.site_dict[ev[1:4]].append(ev)
+        for event in new_events:
+            self._add_event(event)
 
         n_events = []
         for i in range(len(self.event_list)):
@@ -370,6 +482,13 @@ class KMCModel:
         sm = sum(n_events) - o_events
         assert sm == df, "Number of new-old events does not match: {0} {1}".format(sm, df)
 
+        # update rates of events whose next nearest neighborhood changed
+        # (events of nearest neighbors were found anew)
+        if self.barriers is not None:
+            changed = [i1] if event_type == 0 else [i0, i1]
+            refreshed = set(changed).union(*[self.nbr_table[i, :12].tolist() for i in changed])
+            self._update_rates(set(self.nbr_table[changed].ravel().tolist()) - refreshed)
+
         # update atom count
         self.nat = len(self.xyz)
 
@@ -390,22 +509,56 @@ class KMCModel:
              Time of the latest event
         """
 
-        dt = -np.log(np.random.random())/self.etree.Rs
+        dt = -np.log(1.0 - self.rng.random())/self.get_total_rate()
 
         return dt
 
 
+    def get_total_rate(self):
+        """
+        Returns the total rate of all events
+        """
+
+        if self.etree is not None:
+            return self.etree.Rs
+
+        return sum(store.Rs for store in self.event_list)
+
+
+    def find_event(self):
+        """
+        Selects an event with probability proportional to its rate
+
+        Returns
+        -------
+        event_type, event_number: int
+            event type and index of the event in event_list[event_type]
+        """
+
+        if self.etree is not None:
+            return self.etree.find_event()
+
+        # choose event type by its total rate, then an event within the type
+        q = self.get_total_rate()*self.rng.random()
+
+        for event_type, store in enumerate(self.event_list):
+            if q < store.Rs or event_type == len(self.event_list) - 1:
+                return event_type, store.find(min(q, store.Rs))
+            q -= store.Rs
+
+
     def step(self):
         """
         Perform a KMC step.
         """
 
         # return a random event (based on their frequency)
-        event_type, event_number = self.etree.find_event()
+        event_type, event_number = self.find_event()
 
         # perform a step prescribed by the event and return lists of affected events
         n_events = self.move(event_type, event_number)
 
         # update binary search tree
-        self.etree.update_events(n_events)
+        if self.etree is not None:
+            self.etree.update_events(n_events)
  
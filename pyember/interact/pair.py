@@ -0,0 +1,237 @@
+import numpy as np
+from .topology import LatticeTopology, neighbor_shells
+from .dipolar import DipolarInteraction
+
+class PairHamiltonian:
+    """
+    Class defining a classical spin pair Hamiltonian on SC, BCC and FCC lattices
+
+    E = sum_i [H.s_i + A(s_i)] + 1/2 sum_i sum_k J_k sum_{j in shell k of i} s_i.s_j
+
+    with exchange couplings J_k of neighbor shells k = 1, 2, ... and single-ion
+    anisotropy A(s) = K_u (s.n)^2 + K_c (sx^4 + sy^4 + sz^4), optionally
+    with long-range dipolar interactions (see DipolarInteraction).
+
+    Lattices are stored as dense arrays of primitive cells (see
+    neighbor_shells), so that bulk energies are evaluated by stencils of
+    shifted lattice copies, one shift per neighbor offset.
+    """
+
+    def __init__(self, config, params):
+        """Initializes pair Hamiltonian
+
+        Parameters
+        ----------
+        config: Config object
+            lattice type 'SC_n3', 'BCC_n3' or 'FCC_n3'
+        params: dict
+            'Temp' - temperature
+            'J' - list of exchange couplings of neighbor shells (NN first)
+            'H' - external field vector
+            'anisotropy' - optional dict with 'K_u' (uniaxial constant),
+            'axis' (uniaxial direction, default [0, 0, 1]) and 'K_c' (cubic constant)
+            'dipolar' - optional dict with 'D' (dipolar coupling), 'images'
+            (periodic images in the kernel sum) and 'batch' (pending spin
+            changes between field updates)
+        """
+
+        self.latt_type = config['latt_type']
+        self.lattice = self.latt_type.split('_')[0].lower()
+        self._check_consistency(config)
+
+        self.temp = params['Temp']
+        self.beta = 1.0/self.temp
+        self.H = np.array(params['H'], dtype=np.float64)
+        self.J_shells = np.atleast_1d(np.array(params['J'], dtype=np.float64))
+
+        aniso = params.get('anisotropy', {})
+        self.K_u = aniso.get('K_u', 0.0)
+        axis = np.array(aniso.get('axis', [0.0, 0.0, 1.0]), dtype=np.float64)
+        self.axis = axis/np.sqrt(axis.dot(axis))
+        self.K_c = aniso.get('K_c', 0.0)
+
+        self._setup_neighbors()
+        self.energy_i = np.zeros(config['atom_types'].shape, dtype=np.float64)
+        self.energy_total = 0.0
+        self.boxvec = np.diag(config['box'])
+        self.topology = LatticeTopology(config['box'], config['pbc'], self.nbrlist)
+
+        # local fields are not cached (moves use per-neighbor energy changes)
+        self.field = None
+
+        # long-range dipolar term, its energy changes are assigned to the changed site
+        self.dipolar = None
+        if 'dipolar' in params:
+            dip = params['dipolar']
+            self.dipolar = DipolarInteraction(self.topology.dims, self.lattice,
+                    strength=dip.get('D', 1.0), images=dip.get('images', 2), batch=dip.get('batch'))
+            self.dipolar.reset(config['latt_intra'])
+
+
+    def set_temperature(self, temp):
+        """Sets temperature (and inverse temperature) of the system"""
+
+        self.temp = temp
+        self.beta = 1.0/self.temp
+
+
+    def _setup_neighbors(self):
+        """Creates offset tables of neighbor shells and couplings of individual neighbors"""
+
+        self.shells = neighbor_shells(self.lattice, len(self.J_shells))
+
+        self.nbrlist = [nbr for shell in self.shells for nbr in shell]
+
+        # coupling of each neighbor (column of the topology table)
+        self.J = np.concatenate([np.full(len(shell), J) for J, shell in zip(self.J_shells, self.shells)])
+
+        self.ui = np.zeros(len(self.nbrlist) + 1, dtype=np.float64)
+        self.dui = np.zeros(len(self.nbrlist) + 1, dtype=np.float64)
+
+
+    def get_anisotropy(self, spins):
+        """Returns single-ion anisotropy energies of spins, shape(..., 3) -> shape(...)"""
+
+        energy = np.zeros(spins.shape[:-1])
+
+        if self.K_u != 0.0:
+            proj = spins.dot(self.axis)
+            energy = energy + self.K_u*proj*proj
+
+        if self.K_c != 0.0:
+            s2 = spins*spins
+            energy = energy + self.K_c*np.sum(s2*s2, axis=-1)
+
+        return energy
+
+
+    def get_energy_diff_i(self, config, event):
+        """Returns interaction energy difference of a change of spin i
+
+        Parameters
+        ----------
+        config: Config object
+        event: tuple
+            Event: initial to final state of a site given by its flat index
+
+        Returns
+        -------
+        beta*du: float
+            energy difference scaled by inverse temperature; contributions
+            of the site (field, anisotropy) and of its bonds are kept in
+            self.dui, shape(len(nbr)+1,)
+        """
+
+        i = event[0][0]
+        skr = event[1][1]
+
+        latt = self.topology.flat(config['latt_intra'])
+        dsr = skr - latt[i]
+
+        self.dui[0] = self.H.dot(dsr) + self.get_anisotropy(skr) - self.get_anisotropy(latt[i])
+        if self.dipolar is not None:
+            self.dui[0] += self.dipolar.get_energy_diff_i(i, dsr)
+        self.dui[1:] = latt[self.topology.table[i]].dot(dsr)
+        self.dui[1:] *= self.J
+
+        return self.beta*np.sum(self.dui)
+
+
+    def get_energy_i(self, config, i):
+        """Returns interaction energy of atom at flat site index i"""
+
+        latt = self.topology.flat(config['latt_intra'])
+        sir = latt[i]
+
+        self.ui[0] = self.H.dot(sir) + self.get_anisotropy(sir)
+        self.ui[1:] = latt[self.topology.table[i]].dot(sir)
+        self.ui[1:] *= self.J
+
+        return self.ui
+
+
+    def get_energy_total(self, config):
+        """Returns interaction energy of the whole lattice system"""
+
+        energy_total, _, _ = self.get_energy_bulk(config)
+
+        return energy_total
+
+
+    def get_energy_bulk(self, config):
+        """Evaluates energies and magnetization of the whole lattice at once
+
+        Parameters
+        ----------
+        config: Config object
+
+        Returns
+        -------
+        energy_total: float
+            interaction energy of the whole lattice system
+        energy_i: np.array, shape(nat,)
+            interaction energies of individual atoms
+        magnetization: tuple
+            |M| and its components (see get_magnetization)
+        """
+
+        latt = config['latt_intra']
+
+        # u_i = H.s_i + A(s_i) + s_i.h_J,i/2 with exchange field h_J,i = sum_j J_ij s_j
+        ui = latt.dot(self.H) + self.get_anisotropy(latt)
+        ui += 0.5*np.sum(latt*self.get_exchange_field(latt), axis=-1)
+
+        # dipolar site energies (also refreshes dipolar fields)
+        if self.dipolar is not None:
+            ui += self.dipolar.reset(latt)
+
+        self.energy_i[config['latt_i']] = ui
+        self.energy_total = np.sum(ui)
+
+        return self.energy_total, self.energy_i, self.get_magnetization(config)
+
+
+    def get_exchange_field(self, latt):
+        """Returns exchange field sum_k J_k sum_{j in shell k} s_j for every site
+
+        Parameters
+        ----------
+        latt: np.array, shape(Lx, Ly, Lz, 3)
+            spin orientations on the lattice (e.g., config['latt_intra'])
+        """
+
+        field = np.zeros_like(latt)
+        for J, shell in zip(self.J_shells, self.shells):
+            nsum = np.zeros_like(latt)
+            for nbr in shell:
+                nsum += np.roll(latt, tuple(-nbr), axis=(0, 1, 2))
+            field += J*nsum
+
+        return field
+
+
+    def get_local_field(self, config):
+        """Returns field h_i = sum_j J_ij s_j + H acting linearly on every spin (without anisotropy)"""
+
+        field = self.get_exchange_field(config['latt_intra'])
+        field += self.H
+
+        return field
+
+
+    def _check_consistency(self, config):
+        """Checks lattice type and presence of spin coordinates"""
+
+        assert self.latt_type in ('SC_n3', 'BCC_n3', 'FCC_n3'), f"Incompatible lattice {self.latt_type} vs SC_n3, BCC_n3 or FCC_n3"
+
+        if 'latt_intra' not in config.keys():
+            raise KeyError('latt_intra key not in configuration for pair Hamiltonian')
+
+
+    def get_magnetization(self, config):
+
+        sum_sx, sum_sy, sum_sz = np.sum(config['latt_intra'].reshape(-1, 3), axis=0)
+
+        mag = np.sqrt(sum_sx**2 + sum_sy**2 + sum_sz**2)
+
+        return mag, sum_sx, sum_sy, sum_sz
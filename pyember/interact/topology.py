@@ -0,0 +1,114 @@
+import numpy as np
+
+# primitive lattice vectors (rows) in units of the cubic lattice constant
+PRIMITIVE_VECTORS = {
+        'sc': np.eye(3),
+        'bcc': 0.5*np.array([[-1, 1, 1], [1, -1, 1], [1, 1, -1]]),
+        'fcc': 0.5*np.array([[0, 1, 1], [1, 0, 1], [1, 1, 0]])
+    }
+
+def neighbor_shells(lattice, n_shells, grid='primitive'):
+    """Returns offsets of neighboring sites grouped in shells of equal distance
+
+    Parameters
+    ----------
+    lattice: str
+        'sc', 'bcc' or 'fcc'
+    n_shells: int
+        number of neighbor shells (1 - nearest neighbors, 2 - next nearest, ...)
+    grid: str
+        'primitive' - offsets in primitive lattice vectors, for lattices
+        stored as dense arrays of primitive cells (e.g., latt_intra);
+        'cubic' - offsets on the cubic grid with spacing of half the
+        lattice constant (a for SC), on which only sites of the lattice
+        are occupied (e.g., FCC sites with even x+y+z in KMCModel)
+
+    Returns
+    -------
+    shells: list of np.arrays, shape(n_k, 3)
+        integer offsets of the sites in each shell
+    """
+
+    lattice = lattice.lower()
+    if lattice not in PRIMITIVE_VECTORS:
+        raise ValueError(f'Chosen {lattice} lattice. Currently only SC, BCC and FCC lattices are supported.')
+
+    vectors = PRIMITIVE_VECTORS[lattice]
+
+    # candidate offsets within a cube large enough for n_shells
+    m = 2*n_shells + 2
+    n = np.indices((2*m + 1,)*3).reshape(3, -1).T - m
+    r = n @ vectors
+    r2 = np.round(np.sum(r*r, axis=1), 8)
+
+    shells = []
+    for d2 in np.unique(r2[r2 > 0.0])[:n_shells]:
+        offsets = n[r2 == d2]
+        if grid == 'cubic':
+            scale = 1 if lattice == 'sc' else 2
+            offsets = np.rint(r[r2 == d2]*scale).astype(int)
+
+        shells.append(np.array(sorted(map(tuple, offsets), reverse=True), dtype=int))
+
+    return shells
+
+
+class LatticeTopology:
+    """Class holding neighbor index tables over flat lattice site indices"""
+
+    def __init__(self, box, pbc, nbrlist):
+        """Builds the neighbor table of a lattice
+
+        Sites are numbered by their position in the flattened (C-ordered)
+        lattice array, e.g., config['latt_intra'].reshape(-1, 3).
+
+        Parameters
+        ----------
+        box: np.array, shape(3, 3) or shape(3,)
+            lattice box (diagonal matrix) or its dimensions
+        pbc: list of int
+            periodic boundary conditions along each dimension
+        nbrlist: list of np.arrays, shape(3,)
+            offsets of neighboring sites
+        """
+
+        box = np.asarray(box)
+        if box.ndim == 2:
+            box = np.diag(box)
+
+        self.dims = tuple(int(d) for d in box)
+        self.nsites = int(np.prod(self.dims))
+
+        if not all(pbc):
+            raise ValueError(f'Chosen pbc {pbc}. Currently only fully periodic lattices are supported.')
+
+        self.pbc = pbc
+
+        self.nbrlist = np.array(nbrlist, dtype=int)
+        self.z = len(self.nbrlist)
+
+        # lattice coordinates of sites and of their neighbors
+        xyz = np.indices(self.dims).reshape(3, -1).T
+        nbr_xyz = (xyz[:, None, :] + self.nbrlist[None, :, :]) % self.dims
+
+        self.table = np.ravel_multi_index(tuple(nbr_xyz.T), self.dims).T.astype(np.int32)
+
+        # list of bonds (site pairs), one offset of each +/- pair so that
+        # every bond is listed once
+        forward = [k for k, nbr in enumerate(self.nbrlist) if tuple(nbr) > tuple(-nbr)]
+        self.bonds = np.stack([
+                np.repeat(np.arange(self.nsites, dtype=np.int32), len(forward)),
+                self.table[:, forward].ravel()
+            ], axis=-1)
+
+
+    def flat_index(self, ri):
+        """Returns flat site index of lattice position ri"""
+
+        return int(np.ravel_multi_index(tuple(ri), self.dims))
+
+
+    def flat(self, latt):
+        """Returns flat view of lattice data, shape(nsites, ...)"""
+
+        return latt.reshape((self.nsites,) + latt.shape[3:])
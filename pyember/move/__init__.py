@@ -1 +1,3 @@
 from .mmcmove import MMCMove
+from .rng import RandomStream
+from .acceptance import BoltzmannTable
@@ -0,0 +1,38 @@
+import numpy as np
+
+class BoltzmannTable:
+    """
+    Class holding Metropolis acceptance probabilities min(1, exp(-beta*dE))
+    of a discrete spectrum of energy changes.
+
+    The table is rebuilt only when the inverse temperature changes, so the
+    accept/reject step needs a list lookup instead of an exponential.
+    """
+
+    def __init__(self, levels):
+        """
+        Parameters
+        ----------
+        levels: array
+            possible energy changes of a move (e.g., Hamiltonian energy_levels)
+        """
+
+        self.levels = np.asarray(levels, dtype=np.float64)
+        self.beta = None
+        self.probs = None
+
+
+    def set_beta(self, beta):
+        """Recalculates acceptance probabilities for inverse temperature beta"""
+
+        self.beta = beta
+        self.probs = np.exp(-beta*np.clip(self.levels, 0.0, None)).tolist()
+
+
+    def get(self, level, beta):
+        """Returns acceptance probability of the energy change with index level"""
+
+        if beta != self.beta:
+            self.set_beta(beta)
+
+        return self.probs[level]
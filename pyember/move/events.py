@@ -9,17 +9,70 @@
 
 import numpy as np
 from collections import Counter
+from .rng import RandomStream
+
+# bit layout of encoded events (int64): | type | source flat site | direction |
+EVENT_DIR_BITS = 5
+EVENT_SITE_BITS = 32
+EVENT_SITE_SHIFT = EVENT_DIR_BITS
+EVENT_TYPE_SHIFT = EVENT_DIR_BITS + EVENT_SITE_BITS
+EVENT_DIR_MASK = (1 << EVENT_DIR_BITS) - 1
+EVENT_SITE_MASK = (1 << EVENT_SITE_BITS) - 1
+
+# direction index of events without a target site (e.g., deposition)
+NO_DIRECTION = EVENT_DIR_MASK
+
+
+def encode_event(event_type, site, direction):
+    """Packs an event into a single integer
+
+    Parameters
+    ----------
+    event_type: int or np.array of int64
+        event type (index into rates)
+    site: int or np.array of int64
+        flat index of the source site
+    direction: int or np.array of int64
+        index of the neighbor offset to the target site, or NO_DIRECTION
+
+    Returns
+    -------
+    event: int or np.array of int64
+        encoded event
+    """
+
+    return (event_type << EVENT_TYPE_SHIFT) | (site << EVENT_SITE_SHIFT) | direction
+
+
+def decode_event(event):
+    """Unpacks an encoded event (int or np.array of int64)
+
+    Returns
+    -------
+    event_type, site, direction: int or np.array of int64
+    """
+
+    return event >> EVENT_TYPE_SHIFT, (event >> EVENT_SITE_SHIFT) & EVENT_SITE_MASK, event & EVENT_DIR_MASK
+
 
 class EventTree:
     """
     Class maintaining a binary tree for random event type lookup
-    and arrays for choosing specific event. 
+    and arrays for choosing specific event.
+
+    The tree is stored as a flat implicit heap: leaves (total rates of event
+    types) sit at positions size..size+ntypes-1, node j holds the sum of its
+    children 2j and 2j+1, and the root tree[1] is the total rate. A change of
+    one event type updates only the nodes on its leaf-to-root path.
     """
 
-    def __init__(self, rates):
+    def __init__(self, rates, rng=None):
 
         # array of reaction rates 
-        self.rates = np.array(rates)
+        self.rates = np.array(rates, dtype=float)
+
+        # source of random numbers
+        self.rng = rng if rng is not None else RandomStream()
 
         # array for number of events of a given type (same length as rates)
         self.n_events = np.zeros(self.rates.shape, dtype=int)
@@ -30,91 +83,297 @@ class EventTree:
 
     def __setup_tree(self):
         """
-        Builds an empty binary search tree structure (list of arrays) for random event type selection.
-        The values are filled in the update_events method
+        Builds an empty binary search tree (flat array) for random event type selection.
+        The leaf values are filled in the update_event(s) methods
         """
 
-        # create an event decision tree structure
-        self.event_tree = []
-
         nrates = len(self.rates)
 
-        # create arrays of exponentially decreasing lengh divisible by 2
-        while nrates > 1:
+        # number of leaves (power of 2), padded leaves stay zero
+        self.size = 1
+        while self.size < nrates:
+            self.size *= 2
 
-            if nrates % 2 == 1:
-                nrates += 1
+        # node 0 is unused, node 1 is the root
+        self.event_tree = np.zeros((2*self.size), dtype=float)
 
-            self.event_tree.append(np.zeros((nrates), dtype=float))
 
-            nrates //= 2
+    @property
+    def Rs(self):
+        """Total rate of all events"""
+        return self.event_tree[1]
 
-        # top node - total rate
-        self.event_tree.append(np.zeros((1), dtype=float))
 
-        self.kmax = len(self.event_tree)
+    def _update_leaf(self, event_type):
+        """Recalculates the leaf of an event type and partial sums above it"""
 
-        # check tree structure
-        for i, t in enumerate(self.event_tree):
-            print('tree level', i, t.shape)
+        j = self.size + event_type
+        self.event_tree[j] = self.rates[event_type]*self.n_events[event_type]
 
+        j //= 2
+        while j > 0:
+            self.event_tree[j] = self.event_tree[2*j] + self.event_tree[2*j+1]
+            j //= 2
 
-    def update_events(self, n_events):
+
+    def update_event(self, event_type, n):
         """
-        Update tree with new values, if needed
+        Sets the number of events of a single type
         """
 
-        assert len(n_events) == len(self.rates), 'Rates and n_event lists do not match'
+        if self.n_events[event_type] != n:
+            self.n_events[event_type] = n
+            self._update_leaf(event_type)
 
-        # if no changes, return
-        #if np.array_equal(self.n_events, n_events):
-        #    return
 
-        self.n_events[:] = n_events
+    def set_rate(self, event_type, rate):
+        """
+        Sets the rate of a single event type
+        """
 
-        # fill the base level (leaves)
-        self.event_tree[0][:self.rates.shape[0]] = self.rates*self.n_events
+        self.rates[event_type] = rate
+        self._update_leaf(event_type)
 
-        # create partial summs up to the top level
-        for k in range(1, self.kmax):
-            self.event_tree[k][:] = [self.event_tree[k-1][i] + self.event_tree[k-1][i+1] for i in range(0, self.event_tree[k-1].shape[0], 2)]
 
-        self.Rs = self.event_tree[-1][0]
+    def update_events(self, n_events):
+        """
+        Update tree with new values, if needed
+        """
 
-        #for i, t in enumerate(self.event_tree):
-        #    print('tree level', i, t)
+        assert len(n_events) == len(self.rates), 'Rates and n_event lists do not match'
+
+        for event_type, n in enumerate(n_events):
+            self.update_event(event_type, n)
 
 
     def find_event(self):
         """Find and return an event"""
 
-        #for i, t in enumerate(self.event_tree):
-        #    print('tree level runtime', i, t)
-
         # generate a random number [0,Rs)
-        q = self.Rs*np.random.random()
+        q = self.Rs*self.rng.random()
 
-        # cycle through levels (top->down)
-        # start with top-level child (k-2) end with level above bottom (1)
-        j = 0
-        for k in range(self.kmax-2, -1, -1):
+        # descend from the root: go left if q falls within the left child sum
+        # (or if the right subtree is empty, guarding against round-off)
+        j = 1
+        while j < self.size:
+            left = self.event_tree[2*j]
 
-            # left child value
-            left = self.event_tree[k][j]
-
-            if q < left:
+            if q < left or self.event_tree[2*j+1] == 0.0:
                 j = 2*j
             else:
                 q -= left
                 j = 2*j + 1
-        
-        event_type = j
+
+        event_type = j - self.size
 
 
         # select a random event index of a given type 
-        event_number = np.random.randint(self.n_events[event_type])
-        #print('event tree:', event_type, event_number)
+        # (the number of events changes every step, so scale a uniform number
+        # rather than buffering integers for each bound)
+        event_number = int(self.n_events[event_type]*self.rng.random())
 
 
         return event_type, event_number
 
+
+class EventStore:
+    """
+    Class holding events of one type as integer handles, with O(1) insertion,
+    removal and lookup by index.
+
+    Handles are kept in a dense array and a dictionary maps each handle to
+    its slot in the array. A removed handle is replaced by the last one, so
+    the array stays contiguous and an event index drawn uniformly from
+    [0, len) selects a uniformly random event.
+    """
+
+    def __init__(self, capacity=1024):
+        """
+        Parameters
+        ----------
+        capacity: int
+            initial size of the dense array (doubled when full)
+        """
+
+        self.handles = np.zeros((capacity), dtype=np.int64)
+        self.slots = {}
+        self.n = 0
+
+
+    def __len__(self):
+        return self.n
+
+
+    def __contains__(self, handle):
+        return handle in self.slots
+
+
+    def __getitem__(self, slot):
+        """Returns the handle stored at a given slot"""
+
+        if slot >= self.n:
+            raise IndexError(f'Event slot {slot} out of range ({self.n} events)')
+
+        return int(self.handles[slot])
+
+
+    def __iter__(self):
+        return iter(self.handles[:self.n].tolist())
+
+
+    def add(self, handle):
+        """Adds an event handle and returns its slot"""
+
+        if handle in self.slots:
+            raise KeyError(f'Event {handle} already present')
+
+        if self.n == self.handles.shape[0]:
+            self.handles = np.concatenate((self.handles, np.zeros_like(self.handles)))
+
+        slot = self.n
+        self.handles[slot] = handle
+        self.slots[handle] = slot
+        self.n += 1
+
+        return slot
+
+
+    def remove(self, handle):
+        """Removes an event handle, moving the last handle into its slot
+
+        Returns
+        -------
+        slot: int
+            freed slot, now occupied by the previously last handle (if any)
+        """
+
+        slot = self.slots.pop(handle)
+        self.n -= 1
+
+        if slot != self.n:
+            last = int(self.handles[self.n])
+            self.handles[slot] = last
+            self.slots[last] = slot
+
+        return slot
+
+
+class WeightedEventStore(EventStore):
+    """
+    Class holding events of one type with individual rates.
+
+    Rates are kept in a sum tree over the slots of the dense handle array
+    (flat implicit heap as in EventTree), so that an event can be selected
+    with probability proportional to its rate and a rate can be changed in
+    O(log n). Partial sums are recalculated from their children on every
+    update, so rounding errors do not accumulate.
+    """
+
+    def __init__(self, capacity=1024):
+        """
+        Parameters
+        ----------
+        capacity: int
+            initial number of slots (rounded up to a power of 2)
+        """
+
+        size = 1
+        while size < capacity:
+            size *= 2
+
+        super().__init__(size)
+
+        self.size = size
+        self.rate_tree = np.zeros((2*size), dtype=float)
+
+
+    @property
+    def Rs(self):
+        """Total rate of all events"""
+        return self.rate_tree[1]
+
+
+    def _set(self, slot, rate):
+        """Sets the rate of a slot and updates partial sums above it"""
+
+        j = self.size + slot
+        self.rate_tree[j] = rate
+
+        j //= 2
+        while j > 0:
+            self.rate_tree[j] = self.rate_tree[2*j] + self.rate_tree[2*j+1]
+            j //= 2
+
+
+    def _grow(self):
+        """Resizes the tree to the current capacity of the handle array"""
+
+        size = self.handles.shape[0]
+
+        tree = np.zeros((2*size), dtype=float)
+        tree[size:size+self.size] = self.rate_tree[self.size:]
+
+        # rebuild partial sums level by level
+        n = size
+        while n > 1:
+            tree[n//2:n] = tree[n:2*n:2] + tree[n+1:2*n:2]
+            n //= 2
+
+        self.size = size
+        self.rate_tree = tree
+
+
+    def add(self, handle, rate=1.0):
+        """Adds an event handle with a given rate and returns its slot"""
+
+        slot = super().add(handle)
+
+        if self.handles.shape[0] != self.size:
+            self._grow()
+
+        self._set(slot, rate)
+
+        return slot
+
+
+    def remove(self, handle):
+        """Removes an event handle, moving the last handle and its rate into its slot"""
+
+        slot = super().remove(handle)
+
+        last = self.n
+        if slot != last:
+            self._set(slot, self.rate_tree[self.size+last])
+
+        self._set(last, 0.0)
+
+        return slot
+
+
+    def get_rate(self, handle):
+        """Returns the rate of an event"""
+
+        return self.rate_tree[self.size+self.slots[handle]]
+
+
+    def set_rate(self, handle, rate):
+        """Changes the rate of an event"""
+
+        self._set(self.slots[handle], rate)
+
+
+    def find(self, q):
+        """Returns the slot of the event in which q from [0, Rs) falls"""
+
+        # descend from the root (see EventTree.find_event)
+        j = 1
+        while j < self.size:
+            left = self.rate_tree[2*j]
+
+            if q < left or self.rate_tree[2*j+1] == 0.0:
+                j = 2*j
+            else:
+                q -= left
+                j = 2*j + 1
+
+        return j - self.size
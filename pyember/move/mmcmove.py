@@ -1,33 +1,136 @@
+import math
 import numpy as np
+from .rng import RandomStream
 
 class MMCMove:
     """Class managing mmc moves"""
 
 
-    def __init__(self, moves, config):
+    def __init__(self, moves, config, rng=None):
+        """Sets up selected move types
 
+        Parameters
+        ----------
+        moves: dict
+            move types with their selection probabilities. A probability can
+            be replaced by a dict with key 'prob' and move parameters, e.g.,
+            spin_cone_3d: {prob: 1.0, angle: 0.5, target: 0.5}
+        config: Config object
+        rng: RandomStream object, optional
+            source of random numbers (unseeded stream if not given)
+        """
+
+        self.rng = rng if rng is not None else RandomStream()
+
+        self.names = []
         self.moves = []
         self.accepts = []
         self.probs = []
+        self.collective = []
 
         supported_moves = set([
-                'spin_flip_3d'
+                'spin_flip_3d',
+                'spin_flip_3d_sweep',
+                'wolff_3d',
+                'swendsen_wang_3d',
+                'overrelax_3d',
+                'overrelax_3d_sweep',
+                'spin_cone_3d',
+                'heatbath_3d',
+                'heatbath_3d_sweep',
+                'ising_flip'
             ])
 
+        self.boxvec = np.diag(config['box'])
+        self.nsites = int(np.prod(self.boxvec))
+
+        # adaptation of move parameters (e.g., during equilibration)
+        self.adapt = False
+
         prob_sum = 0.0
         for move_type, prob in moves.items():
 
             if move_type not in supported_moves:
                 raise ValueError(f'Move type {move_type} not supported')
 
+            move_params = {}
+            if isinstance(prob, dict):
+                move_params = prob
+                prob = move_params['prob']
+
             if move_type == 'spin_flip_3d':
+                self.latt_type = config['latt_type']
+                assert self.latt_type in ('SC_n3', 'BCC_n3', 'FCC_n3'), "Move does not match the lattice"
+                self.moves.append(self.spin_flip_3d_propose)
+                self.accepts.append(self.spin_flip_3d_accept)
+                self.collective.append(False)
+            elif move_type == 'spin_flip_3d_sweep':
                 self.latt_type = 'SC_n3'
                 assert config['latt_type'] == self.latt_type, "Move does not match the lattice"
-                self.moves.append(self.spin_flip_3d_propose)
+                self._setup_sublattices(config)
+                self.moves.append(self.spin_flip_3d_sweep)
+                self.accepts.append(None)
+                self.collective.append(True)
+            elif move_type == 'wolff_3d':
+                self.latt_type = 'SC_n3'
+                assert config['latt_type'] == self.latt_type, "Move does not match the lattice"
+                self.in_cluster = np.zeros(self.nsites, dtype=bool)
+                self.moves.append(self.wolff_3d)
+                self.accepts.append(None)
+                self.collective.append(True)
+            elif move_type == 'swendsen_wang_3d':
+                self.latt_type = 'SC_n3'
+                assert config['latt_type'] == self.latt_type, "Move does not match the lattice"
+                self.moves.append(self.swendsen_wang_3d)
+                self.accepts.append(None)
+                self.collective.append(True)
+            elif move_type == 'overrelax_3d':
+                self.latt_type = 'SC_n3'
+                assert config['latt_type'] == self.latt_type, "Move does not match the lattice"
+                self.moves.append(self.overrelax_3d)
+                self.accepts.append(None)
+                self.collective.append(True)
+            elif move_type == 'overrelax_3d_sweep':
+                self.latt_type = 'SC_n3'
+                assert config['latt_type'] == self.latt_type, "Move does not match the lattice"
+                self._setup_sublattices(config)
+                self.moves.append(self.overrelax_3d_sweep)
+                self.accepts.append(None)
+                self.collective.append(True)
+            elif move_type == 'spin_cone_3d':
+                self.latt_type = config['latt_type']
+                assert self.latt_type in ('SC_n3', 'BCC_n3', 'FCC_n3'), "Move does not match the lattice"
+                self.cone_index = len(self.moves)
+                self.cone_angle = move_params.get('angle', np.pi/6)
+                self.cone_target = move_params.get('target', 0.5)
+                self.cone_period = move_params.get('period', 100)
+                self.cone_last = (0, 0)
+                self.moves.append(self.spin_cone_3d_propose)
                 self.accepts.append(self.spin_flip_3d_accept)
+                self.collective.append(False)
+            elif move_type == 'heatbath_3d':
+                self.latt_type = 'SC_n3'
+                assert config['latt_type'] == self.latt_type, "Move does not match the lattice"
+                self.moves.append(self.heatbath_3d)
+                self.accepts.append(None)
+                self.collective.append(True)
+            elif move_type == 'heatbath_3d_sweep':
+                self.latt_type = 'SC_n3'
+                assert config['latt_type'] == self.latt_type, "Move does not match the lattice"
+                self._setup_sublattices(config)
+                self.moves.append(self.heatbath_3d_sweep)
+                self.accepts.append(None)
+                self.collective.append(True)
+            elif move_type == 'ising_flip':
+                self.latt_type = 'SC_n1'
+                assert config['latt_type'] == self.latt_type, "Move does not match the lattice"
+                self.moves.append(self.ising_flip_propose)
+                self.accepts.append(self.spin_flip_3d_accept)
+                self.collective.append(False)
             else:
                 pass
 
+            self.names.append(move_type)
             self.probs.append(prob)
             prob_sum += prob
 
@@ -35,45 +138,88 @@ class MMCMove:
         self.probs /= np.sum(self.probs)    # normalize to sum = 1
         self.probs = np.cumsum(self.probs)  # cummulative sum for easy selection
 
-        self.boxvec = np.diag(config['box'])
+        # acceptance statistics
+        self.reset_stats()
 
 
-    def move(self, config):
+    def _setup_sublattices(self, config):
+        """Creates masks of the two parity sublattices of the SC lattice"""
+
+        for dim, pbc in zip(self.boxvec, config['pbc']):
+            if pbc and dim % 2 == 1:
+                raise ValueError(f'Sublattice sweeps need even periodic box dimensions, got {self.boxvec}')
 
-        # choose move
-        self.try_move = np.searchsorted(self.probs, np.random.random())
+        parity = np.indices(tuple(self.boxvec)).sum(axis=0) % 2
+        self.sublattices = [parity == 0, parity == 1]
+
+
+    def select(self):
+        """Chooses a move type, returns True if the move handles its own acceptance"""
+
+        self.try_move = np.searchsorted(self.probs, self.rng.random())
+
+        return self.collective[self.try_move]
+
+
+    def move(self, config):
 
         # perform move
         event = self.moves[self.try_move](config)
+        self.n_tried[self.try_move] += 1
 
         return event
 
 
+    def sweep(self, config, hamilton):
+        """Performs a collective move, returns the number of attempted spin updates"""
+
+        n_tried, n_accepted = self.moves[self.try_move](config, hamilton)
+        self.n_tried[self.try_move] += n_tried
+        self.n_accepted[self.try_move] += n_accepted
+
+        return n_tried
+
+
     def accept(self, config, event, hamilton):
         self.accepts[self.try_move](config, event, hamilton)
+        self.n_accepted[self.try_move] += 1
+
+
+    def reset_stats(self):
+        """Resets acceptance statistics of all move types"""
+
+        self.n_tried = np.zeros(len(self.moves), dtype=np.int64)
+        self.n_accepted = np.zeros(len(self.moves), dtype=np.int64)
+
+        if hasattr(self, 'cone_index'):
+            self.cone_last = (0, 0)
+
+
+    def get_acceptance(self):
+        """Returns acceptance ratios of move types (attempted spin updates)"""
+
+        ratios = {}
+        for name, n_tried, n_accepted in zip(self.names, self.n_tried, self.n_accepted):
+            ratios[name] = n_accepted/n_tried if n_tried > 0 else 0.0
+
+        return ratios
 
 
     def spin_flip_3d_propose(self, config):
         """Select a random spin from a given configuration and generate its random orientation"""
 
-        ix = np.random.randint(self.boxvec[0])
-        iy = np.random.randint(self.boxvec[1])
-        iz = np.random.randint(self.boxvec[2])
+        i = self.rng.randint(self.nsites)
 
         # original spin orientation
-        so = config['latt_intra'][ix, iy, iz]
+        so = config['latt_intra'].reshape(self.nsites, 3)[i]
 
         # new spin orientation
-        sz = 2*np.random.random() - 1
-        st = np.sqrt(1 - sz*sz)
-        phi = 2*np.pi*np.random.random()
-        sx = st*np.sin(phi)
-        sy = st*np.cos(phi)
+        sn = np.array(self._random_spins())
 
-        # create an event tuple
+        # create an event tuple (sites given by flat indices)
         event = (
-                    ((ix, iy, iz), tuple(so)),      # initial state
-                    ((ix, iy, iz), (sx, sy, sz))    # final state
+                    (i, so.copy()), # initial state
+                    (i, sn)         # final state
                 )
 
         return event
@@ -81,17 +227,528 @@ class MMCMove:
 
     def spin_flip_3d_accept(self, config, event, hamilton):
 
-        ri = event[1][0]  # final position
-        ix, iy, iz = ri  # final position
-        config['latt_intra'][ix, iy, iz,:] = event[1][1]  # assign final spin
+        i = event[1][0]  # final position
+        topology = hamilton.topology
+        latt = topology.flat(config['latt_intra'])
+        nbrs = topology.table[i]
+
+        # atom indices of the site and its neighbors
+        latt_i = topology.flat(config['latt_i'])
+
+        if hamilton.field is None:
+            dsr = event[1][1] - latt[i]
+            latt[i] = event[1][1]  # assign final spin
+            hamilton.energy_i[latt_i[i]] += hamilton.dui[0] + 0.5*np.sum(hamilton.dui[1:])
+            np.add.at(hamilton.energy_i, latt_i[nbrs], 0.5*hamilton.dui[1:])
+
+            # long-range fields are updated in batches
+            if hamilton.dipolar is not None:
+                hamilton.dipolar.update(config['latt_intra'], i, dsr)
+
+        else:
+            dsr = event[1][1] - latt[i]
+            latt[i] = event[1][1]  # assign final spin
 
-        i = config['latt_i'][ix, iy, iz]
-        hamilton.energy_i[i] += hamilton.dui[0] + 0.5*np.sum(hamilton.dui[1:])
+            # update local fields of the neighbors only
+            np.add.at(hamilton.field, nbrs, hamilton.J*dsr)
 
-        for nbr, du in zip(hamilton.nbrlist, hamilton.dui[1:]):
-            jx, jy, jz = (np.array(ri) + nbr) % self.boxvec
-            j = config['latt_i'][jx, jy, jz]
-            hamilton.energy_i[j] += 0.5*du
+            # site energies from local fields, u_i = s_i.(h_i + H)/2
+            sites = np.append(nbrs, i)
+            ui = 0.5*np.sum(latt[sites]*(hamilton.field[sites] + hamilton.H), axis=1)
+            hamilton.energy_i[latt_i[sites]] = ui
 
         hamilton.energy_total += np.sum(hamilton.dui)
 
+
+    def ising_flip_propose(self, config):
+        """Select a random Ising spin and flip it"""
+
+        i = self.rng.randint(self.nsites)
+
+        # original spin
+        so = config['latt_intra'].reshape(self.nsites, 1)[i]
+
+        # create an event tuple (sites given by flat indices)
+        event = (
+                    (i, so.copy()), # initial state
+                    (i, -so)        # final state
+                )
+
+        return event
+
+
+    def spin_cone_3d_propose(self, config):
+        """Select a random spin and rotate it by a random angle within a cone
+
+        New orientations are uniformly distributed on the spherical cap of
+        half-angle cone_angle around the current orientation. With adaptation
+        on, the angle is rescaled every cone_period attempts toward the
+        target acceptance ratio.
+        """
+
+        if self.adapt:
+            self._adapt_cone()
+
+        i = self.rng.randint(self.nsites)
+
+        # original spin orientation
+        so = config['latt_intra'].reshape(self.nsites, 3)[i]
+
+        # new spin orientation
+        ct = 1.0 - self.rng.random()*(1.0 - np.cos(self.cone_angle))
+        phi = 2*np.pi*self.rng.random()
+        sn = self._spin_around(so, ct, phi)
+        sn /= np.sqrt(sn.dot(sn))
+
+        # create an event tuple (sites given by flat indices)
+        event = (
+                    (i, so.copy()), # initial state
+                    (i, sn)         # final state
+                )
+
+        return event
+
+
+    def _adapt_cone(self):
+        """Rescales cone angle toward the target acceptance ratio"""
+
+        k = self.cone_index
+        n_tried = self.n_tried[k] - self.cone_last[0]
+
+        if n_tried < self.cone_period:
+            return
+
+        ratio = (self.n_accepted[k] - self.cone_last[1])/n_tried
+        scale = np.clip(ratio/self.cone_target, 0.5, 2.0)
+        self.cone_angle = np.clip(self.cone_angle*scale, 1e-3, np.pi)
+        self.cone_last = (self.n_tried[k], self.n_accepted[k])
+
+
+    def _spins_around(self, axis, ct, phi):
+        """Returns unit vectors at polar angle arccos(ct) and azimuth phi around unit axes
+
+        Parameters
+        ----------
+        axis: np.array, shape(..., 3)
+            unit vectors of the polar axes
+        ct: float or np.array, shape(...)
+            cosines of polar angles
+        phi: float or np.array, shape(...)
+            azimuthal angles
+        """
+
+        axis = np.asarray(axis)
+        ct = np.asarray(ct)[..., None]
+        phi = np.asarray(phi)[..., None]
+
+        # orthonormal basis perpendicular to the axes
+        e1 = np.where(np.abs(axis[..., :1]) < 0.9, [1.0, 0.0, 0.0], [0.0, 1.0, 0.0])
+        e1 -= np.sum(e1*axis, axis=-1, keepdims=True)*axis
+        e1 /= np.sqrt(np.sum(e1*e1, axis=-1, keepdims=True))
+        e2 = np.cross(axis, e1)
+
+        st = np.sqrt(np.clip(1.0 - ct*ct, 0.0, None))
+
+        return ct*axis + st*(np.cos(phi)*e1 + np.sin(phi)*e2)
+
+
+    def _spin_around(self, axis, ct, phi):
+        """Scalar version of _spins_around for a single axis (avoids array overhead)"""
+
+        ax, ay, az = axis
+
+        # orthonormal basis perpendicular to the axis
+        if abs(ax) < 0.9:
+            e1x, e1y, e1z = 1.0 - ax*ax, -ax*ay, -ax*az
+        else:
+            e1x, e1y, e1z = -ay*ax, 1.0 - ay*ay, -ay*az
+        norm = math.sqrt(e1x*e1x + e1y*e1y + e1z*e1z)
+        e1x, e1y, e1z = e1x/norm, e1y/norm, e1z/norm
+        e2x, e2y, e2z = ay*e1z - az*e1y, az*e1x - ax*e1z, ax*e1y - ay*e1x
+
+        st = math.sqrt(max(0.0, 1.0 - ct*ct))
+        cp = st*math.cos(phi)
+        sp = st*math.sin(phi)
+
+        return np.array([ct*ax + cp*e1x + sp*e2x, ct*ay + cp*e1y + sp*e2y, ct*az + cp*e1z + sp*e2z])
+
+
+    def _random_spins(self, size=None):
+        """Generates uniformly distributed random spin orientations"""
+
+        sz = 2*self.rng.random(size) - 1
+        st = np.sqrt(1 - sz*sz)
+        phi = 2*np.pi*self.rng.random(size)
+        sx = st*np.sin(phi)
+        sy = st*np.cos(phi)
+
+        return sx, sy, sz
+
+
+    def _sublattice_field(self, config, hamilton):
+        """Returns local fields of all spins, shape(Lx, Ly, Lz, 3)
+
+        Cached fields of the Hamiltonian are returned as a view, which is
+        updated in place by _sublattice_update.
+        """
+
+        if hamilton.field is None:
+            return hamilton.get_local_field(config)
+
+        return hamilton.field.reshape(config['latt_intra'].shape)
+
+
+    def _sublattice_update(self, config, hamilton, mask, new_spins, field):
+        """Assigns new orientations to spins of a sublattice and updates energies
+
+        Parameters
+        ----------
+        config: Config object
+        hamilton: Hamiltonian object
+        mask: np.array of bool, shape(Lx, Ly, Lz)
+            sublattice sites
+        new_spins: np.array, shape(n, 3)
+            new orientations of the masked spins
+        field: np.array, shape(Lx, Ly, Lz, 3)
+            local fields before the update (see _sublattice_field)
+        """
+
+        latt = config['latt_intra']
+
+        # spin changes and the resulting changes of neighbor fields
+        ds = np.zeros_like(latt)
+        ds[mask] = new_spins - latt[mask]
+        latt += ds
+        dfield = hamilton.J*hamilton.get_neighbor_sum(ds)
+
+        # site energies: external field and half of the pair energy change
+        # for flipped sites, half of the pair energy change for their neighbors
+        dui  = 0.5*np.sum(ds*(field + hamilton.H), axis=-1)
+        dui += 0.5*np.sum(latt*dfield, axis=-1)
+        hamilton.energy_i[config['latt_i']] += dui
+
+        hamilton.energy_total += np.sum(ds[mask]*field[mask])
+
+        if hamilton.field is not None:
+            field += dfield
+
+
+    def spin_flip_3d_sweep(self, config, hamilton):
+        """Metropolis sweep over the whole lattice, one parity sublattice at a time
+
+        Sites of the same sublattice do not interact, so new orientations
+        of all of them are proposed and accepted or rejected at once.
+        """
+
+        latt = config['latt_intra']
+        n_tried = n_accepted = 0
+
+        for mask in self.sublattices:
+
+            n = np.count_nonzero(mask)
+            n_tried += n
+
+            # new spin orientations and energy differences
+            new_spins = np.stack(self._random_spins(n), axis=-1)
+            field = self._sublattice_field(config, hamilton)
+            du = hamilton.get_energy_diff_sublattice(config, mask, new_spins, field=field)
+
+            # accept moves (exponent clipped to avoid overflow)
+            accepted = self.rng.random(n) < np.exp(-hamilton.beta*np.clip(du, 0.0, None))
+            new_spins[~accepted] = latt[mask][~accepted]
+
+            self._sublattice_update(config, hamilton, mask, new_spins, field)
+            n_accepted += np.count_nonzero(accepted)
+
+        return n_tried, n_accepted
+
+
+    def _reflect_spins(self, spins, field):
+        """Reflects spins about their local fields, s' = 2(s.h)h/|h|^2 - s
+
+        Spins in zero local field are left unchanged.
+        """
+
+        h2 = np.sum(field*field, axis=-1, keepdims=True)
+        sh = np.sum(spins*field, axis=-1, keepdims=True)
+        scale = np.divide(2.0*sh, h2, out=np.zeros_like(h2), where=h2 > 0.0)
+
+        return np.where(h2 > 0.0, scale*field - spins, spins)
+
+
+    def overrelax_3d(self, config, hamilton):
+        """Over-relaxation move: reflects a random spin about its local field
+
+        The reflection conserves energy, so it is always accepted.
+        """
+
+        topology = hamilton.topology
+        latt = topology.flat(config['latt_intra'])
+        i = self.rng.randint(self.nsites)
+
+        if hamilton.field is None:
+            field = hamilton.J*np.sum(latt[topology.table[i]], axis=0) + hamilton.H
+        else:
+            field = hamilton.field[i]
+
+        # energy is conserved, but site energies of the spin and its neighbors change
+        event = ((i, latt[i].copy()), (i, self._reflect_spins(latt[i], field)))
+        hamilton.get_energy_diff_i(config, event)
+        self.spin_flip_3d_accept(config, event, hamilton)
+
+        return 1, 1
+
+
+    def overrelax_3d_sweep(self, config, hamilton):
+        """Over-relaxation sweep over the whole lattice, one parity sublattice at a time"""
+
+        latt = config['latt_intra']
+        n_tried = 0
+
+        for mask in self.sublattices:
+            n_tried += np.count_nonzero(mask)
+            field = self._sublattice_field(config, hamilton)
+            new_spins = self._reflect_spins(latt[mask], field[mask])
+            self._sublattice_update(config, hamilton, mask, new_spins, field)
+
+        return n_tried, n_tried
+
+
+    def wolff_3d(self, config, hamilton):
+        """Wolff single-cluster move using reflections of embedded Ising spins
+
+        Spins are reflected about the plane perpendicular to a random unit
+        vector r. Starting from a random seed, the cluster grows over the
+        neighbor table, one shell of newly added sites at a time, adding bonds
+        with probability 1 - exp(min(0, 2*beta*J*(r.s_i)*(r.s_j))). The
+        external field enters through a Metropolis test of the cluster flip.
+
+        The move counts as a single MC step, because a state-dependent step
+        length (e.g., cluster size) would bias observables sampled at fixed
+        time intervals.
+        """
+
+        topology = hamilton.topology
+        latt = topology.flat(config['latt_intra'])
+        in_cluster = self.in_cluster
+
+        # reflection vector and seed site
+        r = np.array(self._random_spins())
+        seed = self.rng.randint(self.nsites)
+        in_cluster[seed] = True
+
+        cluster = [np.array([seed])]
+        frontier = cluster[0]
+
+        # grow the cluster shell by shell
+        while frontier.size > 0:
+            nbrs = topology.table[frontier]
+            proj_i = latt[frontier].dot(r)
+            proj_j = latt[nbrs].dot(r)
+            p_add = -np.expm1(np.minimum(0.0, 2.0*hamilton.beta*hamilton.J*proj_i[:, None]*proj_j))
+            added = ~in_cluster[nbrs] & (self.rng.random(nbrs.shape) < p_add)
+            frontier = np.unique(nbrs[added])
+            in_cluster[frontier] = True
+            cluster.append(frontier)
+
+        cluster = np.concatenate(cluster)
+
+        # spin changes: s -> s - 2(s.r)r
+        ds = -2.0*latt[cluster].dot(r)[:, None]*r
+
+        # Metropolis test for the external field
+        du_ext = ds.dot(hamilton.H)
+        flipped = self.rng.random() < np.exp(-hamilton.beta*max(np.sum(du_ext), 0.0))
+        if flipped:
+
+            # only bonds crossing the cluster boundary change energy
+            nbrs = topology.table[cluster]
+            outside = ~in_cluster[nbrs]
+            du_bond = hamilton.J*np.einsum('ijk,ik->ij', latt[nbrs], ds)*outside
+
+            latt_i = topology.flat(config['latt_i'])
+            hamilton.energy_i[latt_i[cluster]] += du_ext + 0.5*np.sum(du_bond, axis=1)
+            np.add.at(hamilton.energy_i, latt_i[nbrs[outside]], 0.5*du_bond[outside])
+            hamilton.energy_total += np.sum(du_ext) + np.sum(du_bond)
+
+            if hamilton.field is not None:
+                np.add.at(hamilton.field, nbrs.ravel(), hamilton.J*np.repeat(ds, topology.z, axis=0))
+
+            latt[cluster] += ds
+
+        in_cluster[cluster] = False
+
+        return 1, int(flipped)
+
+
+    def _label_clusters(self, n, i, j):
+        """Labels connected components of n sites linked by bonds (i, j)
+
+        Vectorized union-find: roots of bonded trees are hooked to the smaller
+        label and trees are flattened by pointer jumping until all bonds
+        connect sites with equal labels.
+
+        Returns
+        -------
+        labels: np.array, shape(n,)
+            cluster index of each site
+        n_clusters: int
+            number of clusters
+        """
+
+        labels = np.arange(n)
+
+        while True:
+            # pointer jumping (every site points to its root)
+            while True:
+                roots = labels[labels]
+                if np.array_equal(roots, labels):
+                    break
+                labels = roots
+
+            li = labels[i]
+            lj = labels[j]
+            linked = li != lj
+            if not np.any(linked):
+                break
+
+            # hook roots of linked trees to the smaller label
+            low = np.minimum(li[linked], lj[linked])
+            np.minimum.at(labels, li[linked], low)
+            np.minimum.at(labels, lj[linked], low)
+
+        roots, labels = np.unique(labels, return_inverse=True)
+
+        return labels, len(roots)
+
+
+    def swendsen_wang_3d(self, config, hamilton):
+        """Swendsen-Wang multi-cluster sweep using reflections of embedded Ising spins
+
+        Bonds of the whole lattice are activated at once with probabilities
+        1 - exp(min(0, 2*beta*J*(r.s_i)*(r.s_j))), where r is a random unit
+        vector. Each resulting cluster is reflected about the plane
+        perpendicular to r with the heat-bath probability of its external
+        field energy change (1/2 in zero field).
+        """
+
+        topology = hamilton.topology
+        latt = topology.flat(config['latt_intra'])
+
+        # projections of spins on the reflection vector
+        r = np.array(self._random_spins())
+        proj = latt.dot(r)
+
+        # bond activation
+        i, j = topology.bonds.T
+        p_bond = -np.expm1(np.minimum(0.0, 2.0*hamilton.beta*hamilton.J*proj[i]*proj[j]))
+        active = self.rng.random(p_bond.shape) < p_bond
+
+        labels, n_clusters = self._label_clusters(self.nsites, i[active], j[active])
+
+        # external field energy change of cluster reflections
+        du_ext = np.bincount(labels, weights=-2.0*proj*hamilton.H.dot(r), minlength=n_clusters)
+        p_flip = 0.5*(1.0 - np.tanh(0.5*hamilton.beta*du_ext))
+        flip = (self.rng.random(n_clusters) < p_flip)[labels]
+
+        # reflect spins of flipped clusters
+        latt -= 2.0*(proj*flip)[:, None]*r
+
+        # energies of the whole lattice have changed
+        hamilton.get_energy_bulk(config)
+
+        return self.nsites, np.count_nonzero(flip)
+
+
+    def _heatbath_spins(self, field, beta):
+        """Samples spin orientations from the Boltzmann distribution in local fields
+
+        The distribution p(s) ~ exp(-beta*s.h) is sampled exactly: the cosine
+        of the angle to -h is drawn by inverting its cumulative distribution,
+        the azimuth is uniform.
+
+        Parameters
+        ----------
+        field: np.array, shape(..., 3)
+            local fields h
+        beta: float
+            inverse temperature
+        """
+
+        hn = np.sqrt(np.sum(field*field, axis=-1))
+        k = beta*hn
+
+        # axis along -h (any axis in zero field)
+        axis = np.zeros_like(field)
+        axis[..., 2] = 1.0
+        np.divide(-field, hn[..., None], out=axis, where=hn[..., None] > 0.0)
+
+        # inverse CDF of p(ct) ~ exp(k*ct) on [-1, 1], uniform for k -> 0
+        xi = self.rng.random(hn.shape)
+        small = k < 1e-8
+        k_safe = np.where(small, 1.0, k)
+        ct = np.where(small, 2.0*xi - 1.0, 1.0 + np.log1p(xi*np.expm1(-2.0*k_safe))/k_safe)
+        ct = np.clip(ct, -1.0, 1.0)
+
+        phi = 2*np.pi*self.rng.random(hn.shape)
+
+        return self._spins_around(axis, ct, phi)
+
+
+    def _heatbath_spin(self, field, beta):
+        """Scalar version of _heatbath_spins for a single local field"""
+
+        hx, hy, hz = field
+        hn = math.sqrt(hx*hx + hy*hy + hz*hz)
+        k = beta*hn
+
+        # axis along -h (any axis in zero field)
+        axis = (-hx/hn, -hy/hn, -hz/hn) if hn > 0.0 else (0.0, 0.0, 1.0)
+
+        # inverse CDF of p(ct) ~ exp(k*ct) on [-1, 1], uniform for k -> 0
+        xi = self.rng.random()
+        if k < 1e-8:
+            ct = 2.0*xi - 1.0
+        else:
+            ct = min(1.0, max(-1.0, 1.0 + math.log1p(xi*math.expm1(-2.0*k))/k))
+
+        phi = 2*np.pi*self.rng.random()
+
+        return self._spin_around(axis, ct, phi)
+
+
+    def heatbath_3d(self, config, hamilton):
+        """Heat-bath move: samples a random spin from its conditional Boltzmann distribution
+
+        The new orientation is drawn independently of the old one, so the
+        move is always accepted.
+        """
+
+        topology = hamilton.topology
+        latt = topology.flat(config['latt_intra'])
+        i = self.rng.randint(self.nsites)
+
+        if hamilton.field is None:
+            field = hamilton.J*np.sum(latt[topology.table[i]], axis=0) + hamilton.H
+        else:
+            field = hamilton.field[i]
+
+        event = ((i, latt[i].copy()), (i, self._heatbath_spin(field, hamilton.beta)))
+        hamilton.get_energy_diff_i(config, event)
+        self.spin_flip_3d_accept(config, event, hamilton)
+
+        return 1, 1
+
+
+    def heatbath_3d_sweep(self, config, hamilton):
+        """Heat-bath sweep over the whole lattice, one parity sublattice at a time"""
+
+        n_tried = 0
+
+        for mask in self.sublattices:
+            n_tried += np.count_nonzero(mask)
+            field = self._sublattice_field(config, hamilton)
+            new_spins = self._heatbath_spins(field[mask], hamilton.beta)
+            self._sublattice_update(config, hamilton, mask, new_spins, field)
+
+        return n_tried, n_tried
@@ -0,0 +1,69 @@
+import numpy as np
+
+class RandomStream:
+    """
+    Class handing out random numbers generated by numpy.random.Generator.
+
+    Scalar random numbers are pre-generated in blocks and handed out one at a
+    time, which avoids the overhead of individual numpy calls in MC inner
+    loops. Array requests are passed directly to the generator.
+    """
+
+    def __init__(self, seed=None, block_size=4096):
+        """
+        Parameters
+        ----------
+        seed: int, optional
+            random seed, the stream is reproducible for a given seed
+        block_size: int
+            number of pre-generated scalar random numbers per block
+        """
+
+        self.generator = np.random.default_rng(seed)
+        self.block_size = block_size
+
+        # blocks of uniform numbers and of integers for each upper bound
+        self._uniforms = []
+        self._iu = 0
+        self._integers = {}
+
+
+    def random(self, size=None):
+        """Returns uniform random number(s) from [0, 1)"""
+
+        if size is not None:
+            return self.generator.random(size)
+
+        if self._iu == len(self._uniforms):
+            self._uniforms = self.generator.random(self.block_size).tolist()
+            self._iu = 0
+
+        u = self._uniforms[self._iu]
+        self._iu += 1
+
+        return u
+
+
+    def randint(self, high, size=None):
+        """Returns random integer(s) from [0, high)
+
+        Scalar integers are buffered separately for each upper bound, so
+        this is intended for fixed bounds (e.g., number of lattice sites).
+        """
+
+        if size is not None:
+            return self.generator.integers(high, size=size)
+
+        block = self._integers.get(high)
+
+        if block is None or block[1] == len(block[0]):
+            # limit the number of buffered bounds
+            if block is None and len(self._integers) >= 16:
+                self._integers.clear()
+            block = [self.generator.integers(high, size=self.block_size).tolist(), 0]
+            self._integers[high] = block
+
+        i = block[0][block[1]]
+        block[1] += 1
+
+        return i
@@ -1,2 +1,6 @@
 from .simulation import Simulation
 from .mmcsim import MMCSim
+from .ptsim import PTSim
+from .wlsim import WLSim
+from .pasim import PASim
+from .batchsim import BatchMMCSim
@@ -0,0 +1,224 @@
+import numpy as np
+from ..interact import LatticeTopology
+from ..move import RandomStream
+
+class BatchMMCSim:
+    """
+    Class for Metropolis Monte Carlo of many independent Heisenberg replicas
+    on the SC lattice, updated together in vectorized steps.
+
+    Configurations are held as a single stacked array, shape(R, Lx, Ly, Lz, 3),
+    with per-replica coupling J, external field H and inverse temperature beta.
+    """
+
+    def __init__(self, config, params, n_replicas=None, random_seed=42):
+        """
+        Parameters
+        ----------
+        config: dict or list of dicts
+            initial configuration shared by all replicas or one per replica
+        params: dict
+            'Temp', 'J' and 'H' of the Heisenberg Hamiltonian, either common
+            values or per-replica arrays, shape(R,) and shape(R, 3)
+        n_replicas: int, optional
+            number of replicas (default from config list or parameter arrays)
+        random_seed: int
+            seed of the random number stream
+        """
+
+        configs = config if isinstance(config, list) else [config]
+        for conf in configs:
+            assert conf['latt_type'] == 'SC_n3', f"Incompatible lattice {conf['latt_type']} vs SC_n3"
+
+        if n_replicas is None:
+            sizes = [len(configs)] + [np.shape(params[key])[0] for key in ('Temp', 'J') if np.ndim(params[key]) > 0]
+            if np.ndim(params['H']) > 1:
+                sizes.append(np.shape(params['H'])[0])
+            n_replicas = max(sizes)
+        self.n_replicas = n_replicas
+
+        # stacked replica configurations
+        latt = np.stack([conf['latt_intra'] for conf in configs])
+        self.latt = np.array(np.broadcast_to(latt, (n_replicas,) + latt.shape[1:]))
+        self.dims = self.latt.shape[1:4]
+
+        # per-replica parameters
+        self.temp = np.broadcast_to(np.asarray(params['Temp'], dtype=np.float64), (n_replicas,)).copy()
+        self.beta = 1.0/self.temp
+        self.J = np.broadcast_to(np.asarray(params['J'], dtype=np.float64), (n_replicas,)).copy()
+        self.H = np.broadcast_to(np.asarray(params['H'], dtype=np.float64), (n_replicas, 3)).copy()
+
+        self._setup_neighbors()
+        self.topology = LatticeTopology(configs[0]['box'], configs[0]['pbc'], self.nbrlist)
+        self.nsites = self.topology.nsites
+
+        # parity sublattices for vectorized sweeps
+        if any(d % 2 == 1 for d in self.dims):
+            self.sublattices = None
+        else:
+            parity = np.indices(self.dims).sum(axis=0) % 2
+            self.sublattices = [parity == 0, parity == 1]
+
+        self.rng = RandomStream(random_seed)
+        self.replicas = np.arange(n_replicas)
+
+        self.get_energy()
+
+
+    def _setup_neighbors(self):
+        """Creates lists of neighboring sites"""
+
+        nbrlist = []
+
+        # NN
+        nbrlist.append(np.array([ 1, 0, 0]))
+        nbrlist.append(np.array([-1, 0, 0]))
+        nbrlist.append(np.array([ 0, 1, 0]))
+        nbrlist.append(np.array([ 0,-1, 0]))
+        nbrlist.append(np.array([ 0, 0, 1]))
+        nbrlist.append(np.array([ 0, 0,-1]))
+
+        self.nbrlist = nbrlist
+
+
+    def set_temperature(self, temp):
+        """Sets temperatures of all replicas (scalar or shape(R,))"""
+
+        self.temp = np.broadcast_to(np.asarray(temp, dtype=np.float64), (self.n_replicas,)).copy()
+        self.beta = 1.0/self.temp
+
+
+    def get_neighbor_sum(self, latt):
+        """Returns sum of neighbor spins for every site of every replica"""
+
+        nsum = np.zeros_like(latt)
+        for nbr in self.nbrlist:
+            nsum += np.roll(latt, tuple(-nbr), axis=(1, 2, 3))
+
+        return nsum
+
+
+    def get_local_field(self):
+        """Returns local fields h_i = J*sum_j s_j + H, shape(R, Lx, Ly, Lz, 3)"""
+
+        return self.J[:, None, None, None, None]*self.get_neighbor_sum(self.latt) + self.H[:, None, None, None, :]
+
+
+    def get_energy(self):
+        """Returns (and resets) total energies of all replicas, shape(R,)"""
+
+        field = self.get_local_field()
+        hext = self.H[:, None, None, None, :]
+
+        # u_i = s_i.(h_i + H)/2 summed over sites
+        self.energy = 0.5*np.sum(self.latt*(field + hext), axis=(1, 2, 3, 4))
+
+        return self.energy
+
+
+    def get_magnetization(self):
+        """Returns |M| and magnetization vectors of all replicas, shape(R,), shape(R, 3)"""
+
+        mag = np.sum(self.latt, axis=(1, 2, 3))
+
+        return np.sqrt(np.sum(mag*mag, axis=-1)), mag
+
+
+    def _random_spins(self, shape):
+        """Generates uniformly distributed random spin orientations, shape(..., 3)"""
+
+        sz = 2*self.rng.random(shape) - 1
+        st = np.sqrt(1 - sz*sz)
+        phi = 2*np.pi*self.rng.random(shape)
+
+        return np.stack([st*np.sin(phi), st*np.cos(phi), sz], axis=-1)
+
+
+    def _accept(self, du):
+        """Metropolis acceptance of energy changes du, shape(R, ...)"""
+
+        beta = self.beta.reshape((-1,) + (1,)*(du.ndim - 1))
+
+        return self.rng.random(du.shape) < np.exp(-beta*np.clip(du, 0.0, None))
+
+
+    def metropolis_step(self):
+        """Single-spin Metropolis move of one random site in every replica"""
+
+        latt = self.latt.reshape(self.n_replicas, self.nsites, 3)
+        r = self.replicas
+
+        i = self.rng.randint(self.nsites, size=self.n_replicas)
+        nbrs = self.topology.table[i]
+
+        field = self.J[:, None]*np.sum(latt[r[:, None], nbrs], axis=1) + self.H
+        new_spins = self._random_spins(self.n_replicas)
+        ds = new_spins - latt[r, i]
+        du = np.sum(ds*field, axis=-1)
+
+        accepted = self._accept(du)
+        latt[r[accepted], i[accepted]] = new_spins[accepted]
+        self.energy += du*accepted
+
+        return accepted
+
+
+    def sweep(self):
+        """Metropolis sweep of all replicas, one parity sublattice at a time"""
+
+        if self.sublattices is None:
+            raise ValueError(f'Sublattice sweeps need even box dimensions, got {self.dims}')
+
+        n_accepted = np.zeros(self.n_replicas, dtype=np.int64)
+
+        for mask in self.sublattices:
+            n = np.count_nonzero(mask)
+
+            field = self.get_local_field()[:, mask]
+            new_spins = self._random_spins((self.n_replicas, n))
+            old_spins = self.latt[:, mask]
+            du = np.sum((new_spins - old_spins)*field, axis=-1)
+
+            accepted = self._accept(du)
+            self.latt[:, mask] = np.where(accepted[..., None], new_spins, old_spins)
+            self.energy += np.sum(du*accepted, axis=1)
+            n_accepted += np.sum(accepted, axis=1)
+
+        return n_accepted
+
+
+    def run(self, n_sweeps, measure_period=1, sweep=True):
+        """
+        Run all replicas for n_sweeps lattice sweeps (sublattice sweeps or
+        N single-spin Metropolis steps per replica).
+
+        Returns
+        -------
+        results: dict
+            'energy', shape(n_measure, R), and 'magnetization', shape(n_measure, R, 3),
+            recorded every measure_period sweeps, and 'acceptance', shape(R,)
+        """
+
+        energies = []
+        magnetizations = []
+        n_accepted = np.zeros(self.n_replicas, dtype=np.int64)
+
+        for it in range(1, n_sweeps + 1):
+
+            if sweep:
+                n_accepted += self.sweep()
+            else:
+                for _ in range(self.nsites):
+                    n_accepted += self.metropolis_step()
+
+            if it % measure_period == 0:
+                energies.append(self.energy.copy())
+                magnetizations.append(self.get_magnetization()[1])
+
+        results = {
+                'energy': np.array(energies).reshape(-1, self.n_replicas),
+                'magnetization': np.array(magnetizations).reshape(-1, self.n_replicas, 3),
+                'acceptance': n_accepted/(n_sweeps*self.nsites)
+            }
+
+        return results
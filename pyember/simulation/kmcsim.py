@@ -1,6 +1,7 @@
 import sys
 import os
 import random
+from ..move import RandomStream
 
 class KMCSim:
     """
@@ -52,11 +53,14 @@ class KMCSim:
         Initialize a selected model with parameters contained in a dict.
         """
 
+        # initialize random number generator
+        self.rng = RandomStream(random_seed)
+
         # read input configuration
         lat_type, box, xyz = read_cfg(self.incfg_file)
 
         # Initialize KMC system with appropriate lattice type
-        self.kmc = Model(model_type, params, config)
+        self.kmc = Model(model_type, params, config, rng=self.rng)
 
         self.kmc.make_lattice(xyz, box)
 
@@ -66,9 +70,6 @@ class KMCSim:
         # make event list (e.g., identify deposition sites)
         self.kmc.init_events(rates)
 
-        # initialize random number generator
-        random.seed(random_seed)
-
 
     def run(self, config):
         """
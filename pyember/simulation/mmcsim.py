@@ -1,7 +1,8 @@
 import numpy as np
 from ..io import read_xyz, write_xyz
-from ..interact import Heisenberg
-from ..move import MMCMove
+from ..interact import Heisenberg, PairHamiltonian, Ising
+from ..move import MMCMove, RandomStream, BoltzmannTable
+from ..analysis import MMCObservables, StructureFactor
 
 class MMCSim:
     """
@@ -30,9 +31,13 @@ class MMCSim:
         self.print_period = self.mmc_params['time_control']['print']
         self.save_traj_period = self.mmc_params['time_control']['save']
         self.measure_period = self.mmc_params['time_control']['measure']
+        self.t_equil = self.mmc_params['time_control'].get('equilibrate', 0)
+
+        # optional observables, e.g., {'structure_factor': True, 'staggered': False, 'series': True}
+        self.obs_params = sim_params.get('observables', {})
 
         # Supported Hamiltonians
-        hamilton = {'heisenberg': Heisenberg}
+        hamilton = {'heisenberg': Heisenberg, 'pair': PairHamiltonian, 'ising': Ising}
 
         # Set up Hamiltonian and check its compatibility with config
         ham_type = sim_params['hamilton']['type']
@@ -43,13 +48,24 @@ class MMCSim:
         self.du = ham.get_energy_diff_i
         self.get_energy_total = ham.get_energy_total
 
+        # tabulated acceptance for Hamiltonians declaring discrete energy changes
+        self.boltzmann = None
+        if getattr(ham, 'energy_levels', None) is not None:
+            self.boltzmann = BoltzmannTable(ham.energy_levels)
+
+        # initialize random number generator
+        self.rng = RandomStream(sim_params['random_seed'])
+
         # Set up moves
-        self.mmc_params['moves'] = MMCMove(sim_params['moves'], config)
+        self.mmc_params['moves'] = MMCMove(sim_params['moves'], config, rng=self.rng)
+        self.select = self.mmc_params['moves'].select
         self.move = self.mmc_params['moves'].move
         self.accept = self.mmc_params['moves'].accept
+        self.sweep = self.mmc_params['moves'].sweep
 
-        # initialize random number generator
-        np.random.seed(sim_params['random_seed'])
+        # collective moves rely on the NN Heisenberg local field
+        if not isinstance(ham, Heisenberg) and any(self.mmc_params['moves'].collective):
+            raise ValueError(f'Hamiltonian {ham_type} supports only single-spin moves (spin_flip_3d, spin_cone_3d)')
 
 
 
@@ -66,6 +82,47 @@ class MMCSim:
         return config
 
 
+    def step(self):
+        """
+        Performs a single MC move and returns the number of attempted spin updates.
+        Collective moves (e.g., sublattice sweeps) update many spins at once.
+        """
+
+        # choose move type
+        if self.select():
+            return self.sweep(self.config, self.hamilton)
+
+        # try move
+        event = self.move(self.config)
+
+        # energy difference
+        beta_du = self.du(self.config, event)
+
+        # accept move
+        if beta_du < 0:
+            self.accept(self.config, event, self.hamilton)
+        elif self.boltzmann is not None:
+            if self.boltzmann.get(self.hamilton.level, self.hamilton.beta) > self.rng.random():
+                self.accept(self.config, event, self.hamilton)
+        elif np.exp(-beta_du) > self.rng.random():
+            self.accept(self.config, event, self.hamilton)
+
+        return 1
+
+
+    def advance(self, t_steps):
+        """
+        Performs MC moves without runtime outputs until t_steps MC steps
+        are completed. Returns the number of performed MC steps.
+        """
+
+        t = 0
+        while t < t_steps:
+            t += self.step()
+
+        return t
+
+
     def run(self, config=None):
         """
         Run simulation: call model to update configuration.
@@ -73,11 +130,25 @@ class MMCSim:
         Simulation is stopped when final time is reached.
 
         Separate runs can be performed for equilibration and production.
+        During the first 'equilibrate' steps, adaptive move parameters
+        (e.g., cone angle) are tuned and then frozen for production.
+
+        Observables are measured every 'measure' steps (after equilibration).
 
         Parameters
         ----------
         config: dict or Config object
             initial configuration
+
+        Returns
+        -------
+        results: dict
+            mean values, errors and autocorrelation times of measured
+            observables and derived quantities (see MMCObservables), and
+            optionally averaged structure factor 'S_q', connected correlation
+            function 'C_r' and correlation length 'xi' (see StructureFactor),
+            and 'series' of measured energies and magnetization vectors
+            (input of HistogramReweighting)
         """
 
         if config is not None:
@@ -87,33 +158,40 @@ class MMCSim:
         t = t_print = t_save = t_measure = 0.0
 
         # initial energy and magnetization statistics
-        tot_ene = self.hamilton.get_energy_total(self.config)
-        tot_mag, tsx, tsy, tsz = self.hamilton.get_magnetization(self.config)
+        tot_ene, _, (tot_mag, tsx, tsy, tsz) = self.hamilton.get_energy_bulk(self.config)
         print('time, total_energy, |M|, Mx, My, Mz')
         print(t, tot_ene, round(tot_mag), round(tsx), round(tsy), round(tsz))
 
-        while t < self.t_max:
+        # tune adaptive moves during equilibration
+        mover = self.mmc_params['moves']
+        mover.reset_stats()
+        mover.adapt = self.t_equil > 0
 
-            t += 1.0
+        self.observables = MMCObservables(self.config['latt_intra'][..., 0].size, self.hamilton.temp)
 
-            # try move
-            event = self.move(self.config)
+        self.structure_factor = None
+        if self.obs_params.get('structure_factor', False):
+            dims = self.config['latt_intra'].shape[:3]
+            self.structure_factor = StructureFactor(dims, staggered=self.obs_params.get('staggered', False))
 
-            # energy difference
-            beta_du = self.du(self.config, event)
-            #print('du', beta_du)
+        # energy and magnetization time series for histogram reweighting
+        self.series = None
+        if self.obs_params.get('series', False):
+            self.series = {'energy': [], 'magnetization': []}
 
-            # accept move
-            if beta_du < 0:
-                self.accept(self.config, event, self.hamilton)
-            elif np.exp(-beta_du) > np.random.random():
-                self.accept(self.config, event, self.hamilton)
+        while t < self.t_max:
+
+            t += self.step()
 
+            # freeze adaptive moves and restart statistics for production
+            if mover.adapt and t >= self.t_equil:
+                mover.adapt = False
+                mover.reset_stats()
+                t_measure = t
 
             # perform runtime outputs
             if (t - t_print) > self.print_period:
-                tot_ene = self.hamilton.get_energy_total(self.config)
-                tot_mag, tsx, tsy, tsz = self.hamilton.get_magnetization(self.config)
+                tot_ene, _, (tot_mag, tsx, tsy, tsz) = self.hamilton.get_energy_bulk(self.config)
                 print(t, tot_ene, round(tot_mag), round(tsx), round(tsy), round(tsz))
                 t_print = t
 
@@ -121,7 +199,42 @@ class MMCSim:
                 write_xyz(self.config, 'mmc.xyz')
                 t_save = t
 
-            if (t - t_measure) > self.measure_period:
+            if (t - t_measure) > self.measure_period and t >= self.t_equil:
+                tot_mag, tsx, tsy, tsz = self.hamilton.get_magnetization(self.config)
+                self.observables.measure(self.hamilton.energy_total, tot_mag)
+                if self.series is not None:
+                    self.series['energy'].append(self.hamilton.energy_total)
+                    self.series['magnetization'].append((tsx, tsy, tsz))
+                if self.structure_factor is not None:
+                    self.structure_factor.measure(self.config['latt_intra'])
                 t_measure = t
 
+        print('move type, acceptance ratio')
+        for move_type, ratio in mover.get_acceptance().items():
+            print(move_type, ratio)
+
+        results = self.observables.get_results()
+
+        print('observable, mean, error, autocorrelation time')
+        for name in self.observables.names:
+            print(name, results[name], results[name + '_err'], results[name + '_tau'])
+        for name in ['C', 'chi', 'U']:
+            print(name, results[name], results[name + '_err'])
+
+        if self.structure_factor is not None:
+            results['S_q'] = self.structure_factor.get_structure_factor()
+            results['C_r'] = self.structure_factor.get_correlation(connected=True)
+            results['xi'] = self.structure_factor.get_correlation_length()
+            print('second-moment correlation length', results['xi'])
+
+        if self.series is not None:
+            results['series'] = {
+                    'temp': self.hamilton.temp,
+                    'H': self.hamilton.H,
+                    'energy': np.array(self.series['energy']),
+                    'magnetization': np.array(self.series['magnetization']).reshape(-1, 3)
+                }
+
         print('End of simulation')
+
+        return results
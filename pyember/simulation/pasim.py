@@ -0,0 +1,268 @@
+import os
+import copy
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from .mmcsim import MMCSim
+from ..io import read_xyz
+from ..move import RandomStream
+
+def _population_worker(conn, sim_params, names, shape, lo, hi):
+    """
+    Worker process equilibrating replicas lo, ..., hi-1 of the population.
+
+    Replica lattices and energies live in shared memory blocks; the worker
+    runs MC moves directly on the shared arrays, so resampling by the
+    driver needs no transfer of configurations between processes.
+
+    Parameters
+    ----------
+    conn: multiprocessing Connection
+        pipe end for commands from the driver
+    sim_params: dict
+        simulation parameters (config, hamilton, moves, random_seed)
+    names: tuple of str
+        names of shared memory blocks of lattices and energies
+    shape: tuple of int
+        shape of the population lattice array, (R, Lx, Ly, Lz, 3)
+    lo, hi: int
+        range of replicas handled by the worker
+    """
+
+    sim = MMCSim(sim_params)
+
+    latt_shm = shared_memory.SharedMemory(name=names[0])
+    ene_shm = shared_memory.SharedMemory(name=names[1])
+    latt = np.ndarray(shape, dtype=np.float64, buffer=latt_shm.buf)
+    energy = np.ndarray(shape[:1], dtype=np.float64, buffer=ene_shm.buf)
+
+    while True:
+        command, args = conn.recv()
+
+        if command == 'run':
+            temp, t_steps = args
+            sim.hamilton.set_temperature(temp)
+            for r in range(lo, hi):
+                sim.config['latt_intra'] = latt[r]
+                sim.hamilton.get_energy_bulk(sim.config)
+                sim.advance(t_steps)
+                energy[r] = sim.hamilton.energy_total
+            conn.send(True)
+
+        elif command == 'stop':
+            del latt, energy
+            latt_shm.close()
+            ene_shm.close()
+            conn.send(True)
+            conn.close()
+            break
+
+
+class PASim:
+    """
+    Class for simulation flow control of population annealing Monte Carlo.
+
+    A population of replicas, initially at infinite temperature (random
+    spins), is cooled through a temperature schedule. At each temperature
+    the population is resampled according to Boltzmann weights of the
+    temperature change and each replica is equilibrated by MC moves.
+    Replicas are independent between resampling steps, so they are
+    distributed over worker processes operating on shared memory.
+    """
+
+    def __init__(self, sim_params):
+        """
+        Parameters
+        ----------
+        sim_params: dict
+            contains information for setting up a simulation flow control.
+            Key 'annealing' holds 'population' (number of replicas), either
+            'temps' (decreasing temperatures) or 'temp_range' ([T_start,
+            T_end]) with 'steps' (number of temperatures, equally spaced in
+            inverse temperature), and optionally 'sweeps' (lattice sweeps
+            per temperature, default 10) and 'processes' (number of worker
+            processes, default all cores).
+        """
+
+        self.sim_params = sim_params
+        pa_params = sim_params['annealing']
+
+        if 'temps' in pa_params:
+            self.temps = np.array(pa_params['temps'], dtype=np.float64)
+        else:
+            t_start, t_end = pa_params['temp_range']
+            self.temps = 1.0/np.linspace(1.0/t_start, 1.0/t_end, pa_params['steps'])
+        assert np.all(np.diff(self.temps) < 0.0), "Annealing temperatures must decrease"
+
+        self.n_replicas = pa_params['population']
+        self.n_sweeps = pa_params.get('sweeps', 10)
+        self.n_processes = min(pa_params.get('processes', os.cpu_count()), self.n_replicas)
+
+        config = read_xyz(sim_params['config']['file'])
+        self.shape = (self.n_replicas,) + config['latt_intra'].shape
+        self.nsites = int(np.prod(self.shape[1:-1]))
+
+        self.rng = RandomStream(sim_params['random_seed'])
+
+
+    def _start_workers(self):
+        """Creates shared population arrays and starts worker processes"""
+
+        n_bytes = int(np.prod(self.shape))*8
+        self.latt_shm = shared_memory.SharedMemory(create=True, size=n_bytes)
+        self.ene_shm = shared_memory.SharedMemory(create=True, size=self.n_replicas*8)
+        self.latt = np.ndarray(self.shape, dtype=np.float64, buffer=self.latt_shm.buf)
+        self.energy = np.ndarray(self.shape[:1], dtype=np.float64, buffer=self.ene_shm.buf)
+
+        names = (self.latt_shm.name, self.ene_shm.name)
+        bounds = np.linspace(0, self.n_replicas, self.n_processes + 1).astype(int)
+
+        self.workers = []
+        for w in range(self.n_processes):
+            params = copy.deepcopy(self.sim_params)
+            params['random_seed'] = self.sim_params['random_seed'] + w + 1
+
+            conn, child_conn = mp.Pipe()
+            args = (child_conn, params, names, self.shape, bounds[w], bounds[w+1])
+            proc = mp.Process(target=_population_worker, args=args)
+            proc.start()
+            self.workers.append((proc, conn))
+
+
+    def _stop_workers(self):
+        """Stops worker processes and releases shared memory"""
+
+        for proc, conn in self.workers:
+            if proc.is_alive():
+                try:
+                    conn.send(('stop', None))
+                    conn.recv()
+                except (BrokenPipeError, EOFError):
+                    pass
+                proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+
+        del self.latt, self.energy
+        for shm in (self.latt_shm, self.ene_shm):
+            shm.close()
+            shm.unlink()
+
+
+    def _random_population(self):
+        """Fills the population with random spins (equilibrium at infinite temperature)"""
+
+        shape = self.shape[:-1]
+        sz = 2*self.rng.random(shape) - 1
+        st = np.sqrt(1 - sz*sz)
+        phi = 2*np.pi*self.rng.random(shape)
+
+        self.latt[..., 0] = st*np.sin(phi)
+        self.latt[..., 1] = st*np.cos(phi)
+        self.latt[..., 2] = sz
+
+
+    def _population_energies(self):
+        """Returns total energies of all replicas from their lattices"""
+
+        # workers hold the Hamiltonian; zero MC steps only evaluate energies
+        self._advance_population(self.temps[0], 0)
+
+        return self.energy.copy()
+
+
+    def _advance_population(self, temp, t_steps):
+        """Runs MC moves on all replicas in parallel at a given temperature"""
+
+        for _, conn in self.workers:
+            conn.send(('run', (temp, t_steps)))
+
+        for _, conn in self.workers:
+            conn.recv()
+
+
+    def _resample(self, d_beta):
+        """
+        Resamples the population by weights exp(-d_beta*E) with systematic
+        resampling (fixed population size).
+
+        Returns log of the mean weight, ln(Z(beta + d_beta)/Z(beta)).
+        """
+
+        log_w = -d_beta*self.energy
+        log_w_max = np.max(log_w)
+        w = np.exp(log_w - log_w_max)
+        log_q = log_w_max + np.log(np.mean(w))
+
+        # numbers of copies from a single uniform offset
+        cum_w = np.cumsum(w)/np.sum(w)
+        u = (self.rng.random() + np.arange(self.n_replicas))/self.n_replicas
+        index = np.minimum(np.searchsorted(cum_w, u), self.n_replicas - 1)
+
+        self.latt[:] = self.latt[index]
+        self.energy[:] = self.energy[index]
+        self.family = self.family[index]
+
+        return log_q
+
+
+    def run(self):
+        """
+        Run population annealing through the temperature schedule.
+
+        Returns
+        -------
+        results: dict
+            per temperature: 'temp', population averages 'E', 'E_err', 'M'
+            (|M|), specific heat 'C' and susceptibility 'chi' (per spin),
+            free energy 'F' (from ln Z = N ln(4 pi) + sum of ln mean weights),
+            and family size diagnostic 'rho_t' (R * sum of squared family
+            fractions; small compared to R indicates good sampling)
+        """
+
+        names = ['temp', 'E', 'E_err', 'M', 'C', 'chi', 'F', 'rho_t']
+        results = {name: [] for name in names}
+
+        self._start_workers()
+
+        try:
+            self._random_population()
+            self.energy[:] = self._population_energies()
+
+            # infinite temperature partition function of N unit vectors
+            log_z = self.nsites*np.log(4*np.pi)
+            beta = 0.0
+            self.family = np.arange(self.n_replicas)
+            t_steps = self.n_sweeps*self.nsites
+
+            print('temperature, mean energy, free energy, rho_t')
+
+            for temp in self.temps:
+
+                log_z += self._resample(1.0/temp - beta)
+                beta = 1.0/temp
+
+                self._advance_population(temp, t_steps)
+
+                mag = np.linalg.norm(np.sum(self.latt, axis=(1, 2, 3)), axis=-1)
+                families = np.bincount(self.family, minlength=self.n_replicas)
+
+                results['temp'].append(temp)
+                results['E'].append(np.mean(self.energy))
+                results['E_err'].append(np.std(self.energy)/np.sqrt(self.n_replicas))
+                results['M'].append(np.mean(mag))
+                results['C'].append(beta**2*np.var(self.energy)/self.nsites)
+                results['chi'].append(beta*np.var(mag)/self.nsites)
+                results['F'].append(-temp*log_z)
+                results['rho_t'].append(np.sum(families**2)/self.n_replicas)
+
+                print(temp, results['E'][-1], results['F'][-1], results['rho_t'][-1])
+
+            self.configs = self.latt.copy()
+
+        finally:
+            self._stop_workers()
+
+        print('End of simulation')
+
+        return {name: np.array(values) for name, values in results.items()}
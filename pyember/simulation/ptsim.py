@@ -0,0 +1,197 @@
+import os
+import copy
+import multiprocessing as mp
+import numpy as np
+from .mmcsim import MMCSim
+from ..move import RandomStream
+
+def _replica_worker(conn, sim_params, replicas):
+    """
+    Worker process running a group of MMC replicas.
+
+    Replicas stay in the process for the whole simulation; only their
+    temperatures are changed by replica exchange.
+
+    Parameters
+    ----------
+    conn: multiprocessing Connection
+        pipe end for commands from the driver
+    sim_params: dict
+        simulation parameters shared by all replicas
+    replicas: dict
+        replica index: (temperature, random seed)
+    """
+
+    sims = {}
+    for k, (temp, seed) in replicas.items():
+        params = copy.deepcopy(sim_params)
+        params['hamilton']['params']['Temp'] = temp
+        params['random_seed'] = seed
+        sims[k] = MMCSim(params)
+        sims[k].hamilton.get_energy_bulk(sims[k].config)
+
+    while True:
+        command, args = conn.recv()
+
+        if command == 'run':
+            t_steps, temps = args
+            energies = {}
+            for k, sim in sims.items():
+                sim.hamilton.set_temperature(temps[k])
+                sim.advance(t_steps)
+                energies[k] = sim.hamilton.energy_total
+            conn.send(energies)
+
+        elif command == 'stop':
+            conn.send({k: sim.config['latt_intra'] for k, sim in sims.items()})
+            conn.close()
+            break
+
+
+class PTSim:
+    """
+    Class for simulation flow control of parallel tempering (replica exchange)
+    Metropolis Monte Carlo.
+    """
+
+    def __init__(self, sim_params):
+        """
+        Initializes replica exchange simulation with one MMC replica per temperature.
+
+        Parameters
+        ----------
+        sim_params: dict
+            contains information for setting up a simulation flow control.
+            Key 'tempering' holds 'temps' (list of temperatures), 'swap'
+            (MC steps between swap attempts) and optionally 'processes'
+            (number of worker processes, default all cores).
+        """
+
+        self.sim_params = sim_params
+        pt_params = sim_params['tempering']
+
+        self.temps = np.sort(np.array(pt_params['temps'], dtype=np.float64))
+        self.betas = 1.0/self.temps
+        self.n_replicas = len(self.temps)
+        assert self.n_replicas > 1, "Parallel tempering needs at least two temperatures"
+
+        self.swap_period = pt_params['swap']
+        self.n_processes = min(pt_params.get('processes', os.cpu_count()), self.n_replicas)
+
+        self.t_max = sim_params['time_control']['total']
+        self.print_period = sim_params['time_control']['print']
+
+        self.rng = RandomStream(sim_params['random_seed'])
+
+        # replica held at each temperature (initially replica k at temps[k])
+        self.replica_at = np.arange(self.n_replicas)
+
+        # swap statistics for neighboring temperature pairs
+        self.n_swap_tried = np.zeros(self.n_replicas - 1, dtype=np.int64)
+        self.n_swap_accepted = np.zeros(self.n_replicas - 1, dtype=np.int64)
+
+
+    def _start_workers(self):
+        """Starts worker processes and distributes replicas among them"""
+
+        self.workers = []
+        for w in range(self.n_processes):
+            replicas = {}
+            for k in range(w, self.n_replicas, self.n_processes):
+                replicas[k] = (self.temps[k], self.sim_params['random_seed'] + k)
+
+            conn, child_conn = mp.Pipe()
+            proc = mp.Process(target=_replica_worker, args=(child_conn, self.sim_params, replicas))
+            proc.start()
+            self.workers.append((proc, conn))
+
+
+    def _advance_replicas(self, t_steps):
+        """Runs all replicas in parallel, returns energies ordered by temperature"""
+
+        temp_of = np.empty(self.n_replicas)
+        temp_of[self.replica_at] = self.temps
+        temps = dict(enumerate(temp_of))
+
+        for _, conn in self.workers:
+            conn.send(('run', (t_steps, temps)))
+
+        energies = np.empty(self.n_replicas)
+        for _, conn in self.workers:
+            for k, ene in conn.recv().items():
+                energies[k] = ene
+
+        return energies[self.replica_at]
+
+
+    def _attempt_swaps(self, energies, parity):
+        """
+        Attempts exchanges of temperatures between neighboring pairs (m, m+1)
+        with m of given parity. energies are ordered by temperature.
+        """
+
+        for m in range(parity, self.n_replicas - 1, 2):
+            self.n_swap_tried[m] += 1
+            arg = (self.betas[m] - self.betas[m+1])*(energies[m] - energies[m+1])
+
+            if arg >= 0.0 or np.exp(arg) > self.rng.random():
+                self.n_swap_accepted[m] += 1
+                self.replica_at[[m, m+1]] = self.replica_at[[m+1, m]]
+                energies[[m, m+1]] = energies[[m+1, m]]
+
+
+    def get_swap_acceptance(self):
+        """Returns swap acceptance ratios of neighboring temperature pairs"""
+
+        return self.n_swap_accepted/np.maximum(self.n_swap_tried, 1)
+
+
+    def run(self):
+        """
+        Run replica exchange simulation: all replicas are advanced by 'swap'
+        MC steps in parallel, followed by swap attempts between neighboring
+        temperatures (alternating even and odd pairs).
+
+        Final configurations ordered by temperature are stored in self.configs.
+        """
+
+        self._start_workers()
+
+        t = t_print = 0
+        parity = 0
+
+        print('time, total energies at temperatures', *self.temps)
+
+        try:
+            while t < self.t_max:
+
+                t_steps = min(self.swap_period, self.t_max - t)
+                energies = self._advance_replicas(t_steps)
+                t += t_steps
+
+                self._attempt_swaps(energies, parity)
+                parity = 1 - parity
+
+                if (t - t_print) >= self.print_period:
+                    print(t, *energies)
+                    t_print = t
+
+            # collect final configurations
+            configs = {}
+            for proc, conn in self.workers:
+                conn.send(('stop', None))
+                configs.update(conn.recv())
+                proc.join()
+
+        finally:
+            for proc, _ in self.workers:
+                if proc.is_alive():
+                    proc.terminate()
+
+        self.configs = [configs[k] for k in self.replica_at]
+
+        print('temperature pair, swap acceptance ratio')
+        for m, ratio in enumerate(self.get_swap_acceptance()):
+            print(self.temps[m], self.temps[m+1], ratio)
+
+        print('End of simulation')
@@ -5,6 +5,9 @@ import copy
 import yaml
 from .mmcsim import MMCSim
 from .kmcsim import KMCSim
+from .ptsim import PTSim
+from .wlsim import WLSim
+from .pasim import PASim
 
 class Simulation:
     """ Class for setting up a simulation based on given control information.
@@ -45,6 +48,15 @@ class Simulation:
         elif self.sim_params['sim_type'] == 'KMC':
             kmc = KMCSim(self.sim_params)
             self.run = kmc.run
+        elif self.sim_params['sim_type'] == 'PT':
+            pt = PTSim(self.sim_params)
+            self.run = pt.run
+        elif self.sim_params['sim_type'] == 'WL':
+            wl = WLSim(self.sim_params)
+            self.run = wl.run
+        elif self.sim_params['sim_type'] == 'PA':
+            pa = PASim(self.sim_params)
+            self.run = pa.run
 
 
     def _check_control_dict(self, setup_dict):
@@ -72,6 +84,24 @@ class Simulation:
             else:
                 assert 'rates' in setup_dict, "No rates information for KMC"
 
+        # check if parallel tempering has temperatures and swap period
+        if setup_dict['sim_type'] == 'PT':
+            assert 'tempering' in setup_dict, "Tempering parameters are missing for PT"
+            assert 'temps' in setup_dict['tempering'], "Temperatures are missing for PT"
+            assert 'swap' in setup_dict['tempering'], "Swap period is missing for PT"
+
+        # check if Wang-Landau has energy range and binning
+        if setup_dict['sim_type'] == 'WL':
+            assert 'wang_landau' in setup_dict, "Wang-Landau parameters are missing for WL"
+            assert 'e_range' in setup_dict['wang_landau'], "Energy range is missing for WL"
+            assert 'bins' in setup_dict['wang_landau'], "Number of energy bins is missing for WL"
+
+        # check if population annealing has population size and temperature schedule
+        if setup_dict['sim_type'] == 'PA':
+            assert 'annealing' in setup_dict, "Annealing parameters are missing for PA"
+            assert 'population' in setup_dict['annealing'], "Population size is missing for PA"
+            assert 'temps' in setup_dict['annealing'] or 'temp_range' in setup_dict['annealing'], "Temperature schedule is missing for PA"
+
         # check basic time control parameters
         assert 'total' in setup_dict['time_control'], "Total simulation length is missing"
 
@@ -85,6 +115,9 @@ class Simulation:
         if 'measure' not in setup_dict['time_control']:
             setup_dict['time_control']['measure'] = 10
 
+        if 'equilibrate' not in setup_dict['time_control']:
+            setup_dict['time_control']['equilibrate'] = 0
+
         return setup_dict
 
 if __name__ == "__main__":
@@ -0,0 +1,378 @@
+import os
+import copy
+import multiprocessing as mp
+import numpy as np
+from .mmcsim import MMCSim
+from ..analysis.reweight import logsumexp
+
+class WLWindow:
+    """
+    Wang-Landau random walk in energy restricted to a single energy window.
+
+    Uses the Hamiltonian and local moves of an MMCSim object; the
+    temperature is set to 1, so that energy differences returned by the
+    Hamiltonian are plain energy changes.
+    """
+
+    def __init__(self, sim_params, e_min, e_max, n_bins, wl_params):
+        """
+        Parameters
+        ----------
+        sim_params: dict
+            simulation parameters (config, hamilton, moves, random_seed)
+        e_min, e_max: float
+            energy window (total energies)
+        n_bins: int
+            number of energy bins in the window
+        wl_params: dict
+            Wang-Landau parameters (see WLSim)
+        """
+
+        self.sim = MMCSim(sim_params)
+        self.config = self.sim.config
+        self.hamilton = self.sim.hamilton
+        self.hamilton.set_temperature(1.0)
+
+        if any(self.sim.mmc_params['moves'].collective):
+            raise ValueError('Wang-Landau sampling supports only single-spin moves (spin_flip_3d, spin_cone_3d)')
+
+        self.e_min = e_min
+        self.e_max = e_max
+        self.n_bins = n_bins
+        self.width = (e_max - e_min)/n_bins
+
+        self.ln_f = wl_params.get('ln_f', 1.0)
+        self.ln_f_final = wl_params.get('ln_f_final', 1e-6)
+        self.flatness = wl_params.get('flatness', 0.8)
+        self.schedule = wl_params.get('schedule', 'halve')
+
+        nsites = self.config['latt_intra'][..., 0].size
+        self.check_period = wl_params.get('check', 100*nsites)
+        self.t_max = sim_params['time_control']['total']
+
+        self.ln_g = np.zeros(n_bins)
+        self.hist = np.zeros(n_bins, dtype=np.int64)
+        self.visited = np.zeros(n_bins, dtype=bool)
+
+        # microcanonical sums of |M| and M^2 in energy bins
+        self.n_samples = np.zeros(n_bins, dtype=np.int64)
+        self.mag_sum = np.zeros(n_bins)
+        self.mag2_sum = np.zeros(n_bins)
+
+
+    def _bin(self, energy):
+        """Returns bin index of an energy, or -1 outside the window"""
+
+        if energy < self.e_min or energy >= self.e_max:
+            return -1
+
+        return min(int((energy - self.e_min)/self.width), self.n_bins - 1)
+
+
+    def _distance(self, energy):
+        """Returns distance of an energy from the window"""
+
+        return max(self.e_min - energy, energy - self.e_max, 0.0)
+
+
+    def _enter_window(self):
+        """Drives the configuration into the energy window by accepting
+        only moves that do not increase the distance from the window"""
+
+        energy = self.hamilton.get_energy_bulk(self.config)[0]
+        t = 0
+
+        while self._bin(energy) < 0:
+
+            if t >= self.t_max:
+                raise RuntimeError(f'Energy window [{self.e_min}, {self.e_max}] not reached from {energy}')
+
+            self.sim.select()
+            event = self.sim.move(self.config)
+            du = self.sim.du(self.config, event)
+            t += 1
+
+            if self._distance(energy + du) <= self._distance(energy):
+                self.sim.accept(self.config, event, self.hamilton)
+                energy = self.hamilton.energy_total
+
+        self.mag = np.array(self.hamilton.get_magnetization(self.config)[1:])
+
+        return t
+
+
+    def _walk(self, n_steps):
+        """Performs n_steps Wang-Landau moves"""
+
+        rng = self.sim.rng
+        ln_g = self.ln_g
+        energy = self.hamilton.energy_total
+        k = self._bin(energy)
+
+        for _ in range(n_steps):
+
+            self.sim.select()
+            event = self.sim.move(self.config)
+            du = self.sim.du(self.config, event)
+            k_new = self._bin(energy + du)
+
+            # acceptance min(1, g(E)/g(E')), moves out of the window are rejected
+            if k_new >= 0:
+                arg = ln_g[k] - ln_g[k_new]
+                if arg >= 0.0 or np.exp(arg) > rng.random():
+                    self.sim.accept(self.config, event, self.hamilton)
+                    self.mag += event[1][1] - event[0][1]
+                    energy = self.hamilton.energy_total
+                    k = k_new
+
+            ln_g[k] += self.ln_f
+            self.hist[k] += 1
+
+            m2 = self.mag.dot(self.mag)
+            self.n_samples[k] += 1
+            self.mag_sum[k] += np.sqrt(m2)
+            self.mag2_sum[k] += m2
+
+
+    def _is_flat(self):
+        """Checks flatness of the histogram on all bins visited so far"""
+
+        self.visited |= self.hist > 0
+        hist = self.hist[self.visited]
+
+        return hist.min() >= self.flatness*hist.mean()
+
+
+    def run(self):
+        """
+        Runs Wang-Landau iterations until ln_f drops below ln_f_final.
+        ln_f is halved whenever the histogram is flat; with schedule '1/t',
+        it follows 1/t (t in MC sweeps) once ln_f < 1/t.
+
+        Returns
+        -------
+        results: dict
+            'ln_g', 'visited' and microcanonical 'n_samples', 'mag_sum', 'mag2_sum'
+        """
+
+        t = self._enter_window()
+        nsites = self.config['latt_intra'][..., 0].size
+        one_over_t = False
+
+        while self.ln_f > self.ln_f_final and t < self.t_max:
+
+            self._walk(self.check_period)
+            t += self.check_period
+
+            if one_over_t:
+                self.visited |= self.hist > 0
+                self.ln_f = nsites/t
+
+            elif self._is_flat():
+                self.ln_f *= 0.5
+                self.hist[:] = 0
+                print(self.e_min, self.e_max, t, self.ln_f)
+                if self.schedule == '1/t' and self.ln_f < nsites/t:
+                    one_over_t = True
+                    self.ln_f = nsites/t
+
+        if self.ln_f > self.ln_f_final:
+            print(f'Warning: window [{self.e_min}, {self.e_max}] stopped at ln_f = {self.ln_f}')
+
+        self.visited |= self.hist > 0
+        self.ln_g[~self.visited] = -np.inf
+
+        results = {
+                'ln_g': self.ln_g,
+                'visited': self.visited,
+                'n_samples': self.n_samples,
+                'mag_sum': self.mag_sum,
+                'mag2_sum': self.mag2_sum
+            }
+
+        return results
+
+
+def _window_worker(sim_params, e_min, e_max, n_bins, wl_params):
+    """Runs a Wang-Landau walk in a single energy window (worker process)"""
+
+    return WLWindow(sim_params, e_min, e_max, n_bins, wl_params).run()
+
+
+class WLSim:
+    """
+    Class for simulation flow control of Wang-Landau (flat histogram)
+    sampling of the density of states g(E).
+
+    The energy range can be split into overlapping windows sampled in
+    parallel processes; ln g(E) of the windows is stitched afterwards.
+
+    Spins are continuous, so canonical averages are accurate only at
+    temperatures T much larger than the energy bin width.
+    """
+
+    def __init__(self, sim_params):
+        """
+        Parameters
+        ----------
+        sim_params: dict
+            contains information for setting up a simulation flow control.
+            Key 'wang_landau' holds 'e_range' ([E_min, E_max] of total
+            energy), 'bins' (number of energy bins) and optionally
+            'windows' (default 1), 'overlap' (fraction of window width
+            shared by neighbors, default 0.5), 'ln_f' (initial modification
+            factor, default 1), 'ln_f_final' (default 1e-6), 'flatness'
+            (default 0.8), 'check' (MC steps between flatness checks),
+            'schedule' ('halve' or '1/t') and 'processes'.
+        """
+
+        self.sim_params = sim_params
+        self.wl_params = sim_params['wang_landau']
+
+        self.e_min, self.e_max = self.wl_params['e_range']
+        self.n_bins = self.wl_params['bins']
+        self.width = (self.e_max - self.e_min)/self.n_bins
+        self.energy = self.e_min + self.width*(np.arange(self.n_bins) + 0.5)
+
+        self.n_windows = self.wl_params.get('windows', 1)
+        self.overlap = self.wl_params.get('overlap', 0.5)
+        self.n_processes = min(self.wl_params.get('processes', os.cpu_count()), self.n_windows)
+
+        self.windows = self._setup_windows()
+
+
+    def _setup_windows(self):
+        """Returns (first bin, last bin + 1) of overlapping windows covering all bins"""
+
+        if self.n_windows == 1:
+            return [(0, self.n_bins)]
+
+        # window width w with overlap o: n*w - (n-1)*o*w = n_bins
+        w = self.n_bins/(self.n_windows - (self.n_windows - 1)*self.overlap)
+        shift = w*(1.0 - self.overlap)
+
+        windows = []
+        for k in range(self.n_windows):
+            lo = int(round(k*shift))
+            hi = self.n_bins if k == self.n_windows - 1 else int(round(k*shift + w))
+            windows.append((lo, hi))
+
+        return windows
+
+
+    def _stitch(self, results):
+        """Joins ln g of windows, matching each to the previous one on common visited bins"""
+
+        ln_g = np.full(self.n_bins, -np.inf)
+        n_samples = np.zeros(self.n_bins, dtype=np.int64)
+        mag_sum = np.zeros(self.n_bins)
+        mag2_sum = np.zeros(self.n_bins)
+
+        for (lo, hi), res in zip(self.windows, results):
+
+            window = np.arange(lo, hi)
+            visited = res['visited']
+            common = visited & np.isfinite(ln_g[window])
+
+            shift = 0.0
+            if np.any(common):
+                shift = np.mean(ln_g[window][common] - res['ln_g'][common])
+
+                # previous window is used up to the middle of the common bins
+                mid = window[common][len(window[common])//2]
+                use = visited & ((window >= mid) | ~np.isfinite(ln_g[window]))
+            else:
+                use = visited
+
+            ln_g[window[use]] = res['ln_g'][use] + shift
+            n_samples[window] += res['n_samples']
+            mag_sum[window] += res['mag_sum']
+            mag2_sum[window] += res['mag2_sum']
+
+        return ln_g, n_samples, mag_sum, mag2_sum
+
+
+    def run(self):
+        """
+        Run Wang-Landau sampling in all energy windows and combine the results.
+
+        ln g(E) is normalized so that sum_E g(E) = (4 pi)^N, assuming the
+        energy range contains practically all states (infinite temperature).
+
+        Returns
+        -------
+        results: dict
+            bin centers 'energy', 'ln_g', and microcanonical averages 'M'
+            (|M|) and 'M2' of visited bins
+        """
+
+        tasks = []
+        for k, (lo, hi) in enumerate(self.windows):
+            params = copy.deepcopy(self.sim_params)
+            params['random_seed'] = self.sim_params['random_seed'] + k
+            e_lo = self.e_min + lo*self.width
+            e_hi = self.e_min + hi*self.width
+            tasks.append((params, e_lo, e_hi, hi - lo, self.wl_params))
+
+        print('window, energy range')
+        for k, task in enumerate(tasks):
+            print(k, task[1], task[2])
+
+        print('energy range, time, ln_f')
+
+        if self.n_processes > 1:
+            with mp.Pool(self.n_processes) as pool:
+                results = pool.starmap(_window_worker, tasks)
+        else:
+            results = [_window_worker(*task) for task in tasks]
+
+        ln_g, n_samples, mag_sum, mag2_sum = self._stitch(results)
+
+        # normalization to the total phase space volume of N unit vectors
+        nsites = int(np.prod(self.sim_params['config']['latt_box']))
+        ln_g += nsites*np.log(4*np.pi) - logsumexp(ln_g)
+
+        self.ln_g = ln_g
+        self.mag = np.divide(mag_sum, n_samples, out=np.zeros(self.n_bins), where=n_samples > 0)
+        self.mag2 = np.divide(mag2_sum, n_samples, out=np.zeros(self.n_bins), where=n_samples > 0)
+        self.nsites = nsites
+
+        print('End of simulation')
+
+        return {'energy': self.energy, 'ln_g': self.ln_g, 'M': self.mag, 'M2': self.mag2}
+
+
+    def get_thermodynamics(self, temps):
+        """
+        Returns a dict of canonical averages at given temperatures computed
+        from ln g(E): internal energy 'E', specific heat 'C' (per spin), free
+        energy 'F', entropy 'S', '|M|' and susceptibility 'chi' (per spin),
+        each of shape(n_temps,).
+        """
+
+        temps = np.atleast_1d(np.asarray(temps, dtype=np.float64))
+        betas = 1.0/temps
+
+        visited = np.isfinite(self.ln_g)
+        energy = self.energy[visited]
+
+        log_w = self.ln_g[visited][None, :] - betas[:, None]*energy[None, :]
+        log_z = logsumexp(log_w, axis=1)
+        w = np.exp(log_w - log_z[:, None])
+
+        e1 = w @ energy
+        e2 = w @ (energy*energy)
+        m1 = w @ self.mag[visited]
+        m2 = w @ self.mag2[visited]
+
+        results = {
+                'temp': temps,
+                'E': e1,
+                'C': betas**2*(e2 - e1**2)/self.nsites,
+                'F': -temps*log_z,
+                'S': betas*e1 + log_z,
+                'M': m1,
+                'chi': betas*(m2 - m1**2)/self.nsites
+            }
+
+        return results